@@ -0,0 +1,192 @@
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+# Runs yt_auto_download.py end to end, recording with fake_ytarchive.py and uploading to
+# fake_drive.py, in a scratch folder, and reports what the pipeline achieved:
+#
+#   python bench_pipeline.py --streams 50 --output bench_results.json
+#   python bench_pipeline.py --save-baseline bench_baseline.json  # after a known-good run
+#   python bench_pipeline.py --baseline bench_baseline.json       # exit 1 on a regression
+#
+# bench_baseline.json is the reference: the default settings, run on a single-core Linux VM.
+# Throughput, latency and CPU depend on the machine, so on other hardware record a baseline
+# of your own from a known-good commit before comparing changes against it.
+#
+# CPU time and peak RSS are the pipeline process's own, sampled from /proc (Linux), so the
+# fake recorders it runs do not count against it.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SAMPLE_INTERVAL = 0.2
+
+# Metric -> (True if higher is better, smallest change that counts). Only these are compared
+# against a baseline. The floors keep run-to-run noise in sub-second latencies and in CPU time
+# from reading as a regression.
+METRICS = {
+    "streams_per_hour": (True, 0),
+    "upload_mb_per_s": (True, 0),
+    "latency_p50_s": (False, 0.5),
+    "latency_p95_s": (False, 0.5),
+    "latency_p99_s": (False, 0.5),
+    "peak_rss_mb": (False, 0),
+    "cpu_s_per_stream": (False, 0.02),
+}
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(int(round(p / 100 * (len(values) - 1))), len(values) - 1)]
+
+def proc_usage(pid):
+    # (CPU seconds, peak RSS in MiB) of pid itself, or None once it has exited
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open(f"/proc/{pid}/status") as f:
+            hwm = next(int(line.split()[1]) for line in f if line.startswith("VmHWM:"))
+    except (OSError, StopIteration):
+        return None
+    ticks = os.sysconf("SC_CLK_TCK")
+    return (int(fields[11]) + int(fields[12])) / ticks, hwm / 1024
+
+def start_drive(args):
+    command = [sys.executable, os.path.join(HERE, "fake_drive.py"), "--port", "0",
+               "--latency", str(args.drive_latency), "--bandwidth", str(args.drive_bandwidth),
+               "--fail-rate", str(args.drive_fail_rate), "--seed", str(args.seed)]
+    drive = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    # First line: "Drive stand-in on http://127.0.0.1:<port>/"
+    endpoint = drive.stdout.readline().split()[-1]
+    return drive, endpoint
+
+def run_pipeline(args, work, endpoint):
+    recorder = (f"{sys.executable} {os.path.join(HERE, 'fake_ytarchive.py')} --duration {args.duration}"
+                f" --jitter {args.jitter} --speed {args.speed} --bitrate {args.bitrate}"
+                f" --fail-rate {args.record_fail_rate} --seed {args.seed}")
+    env = dict(os.environ, YTARCHIVE_BIN=recorder, DRIVE_API_ENDPOINT=endpoint,
+               MAX_CONCURRENT_RECORDINGS=str(args.streams))
+    if args.stable_seconds is not None:
+        env["STABLE_SECONDS"] = str(args.stable_seconds)
+    with open(os.path.join(work, "urls.txt"), "w") as f:
+        for i in range(args.streams):
+            f.write(f"https://www.youtube.com/watch?v=bench{i:06d}\n")
+
+    started = time.time()
+    with open(os.path.join(work, "pipeline.log"), "w") as log:
+        proc = subprocess.Popen([sys.executable, os.path.join(HERE, "yt_auto_download.py"), "--no-probe"],
+                                cwd=work, env=env, stdout=log, stderr=subprocess.STDOUT)
+        usage = (0, 0)
+        while proc.poll() is None:
+            usage = proc_usage(proc.pid) or usage
+            time.sleep(SAMPLE_INTERVAL)
+    return proc.returncode, time.time() - started, usage
+
+def collect(args, work, wall, usage):
+    db = sqlite3.connect(os.path.join(work, "jobs.db"))
+    recorded = db.execute("SELECT COUNT(*) FROM jobs WHERE state != 'failed'").fetchone()[0]
+    uploads = db.execute("SELECT path, size, updated FROM uploads WHERE state = 'verified'").fetchall()
+    db.close()
+    # Record-to-upload latency: from the recording's last write to Drive confirming the upload
+    latencies = []
+    first_done = None
+    for path, size, updated in uploads:
+        finished = os.path.getmtime(os.path.join(work, path))
+        latencies.append(updated - finished)
+        first_done = min(first_done or finished, finished)
+    uploaded = sum(size for _, size, _ in uploads)
+    upload_window = max(updated for _, _, updated in uploads) - first_done if uploads else 0
+    cpu, rss = usage
+    return {
+        "streams": args.streams,
+        "recorded": recorded,
+        "uploaded_files": len(uploads),
+        "uploaded_mb": round(uploaded / 1e6, 1),
+        "wall_s": round(wall, 2),
+        "streams_per_hour": round(recorded / wall * 3600, 1),
+        "upload_mb_per_s": round(uploaded / 1e6 / upload_window, 2) if upload_window else None,
+        "latency_p50_s": round(percentile(latencies, 50), 2) if latencies else None,
+        "latency_p95_s": round(percentile(latencies, 95), 2) if latencies else None,
+        "latency_p99_s": round(percentile(latencies, 99), 2) if latencies else None,
+        "peak_rss_mb": round(rss, 1),
+        "cpu_s": round(cpu, 2),
+        "cpu_s_per_stream": round(cpu / recorded, 3) if recorded else None,
+    }
+
+def compare(results, baseline, tolerance):
+    # Metrics more than tolerance (a fraction) worse than the baseline
+    regressions = []
+    for metric, (higher_is_better, floor) in METRICS.items():
+        now, before = results.get(metric), baseline.get(metric)
+        if now is None or not before:
+            continue
+        change = (now - before) / before
+        worse = -change if higher_is_better else change
+        print(f"  {metric:18} {before:>10} -> {now:<10} ({change:+.1%})")
+        if worse > tolerance and abs(now - before) > floor:
+            regressions.append(metric)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the record -> upload pipeline against local fakes.")
+    parser.add_argument("--streams", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=120, help="stream length in seconds (stream time)")
+    parser.add_argument("--jitter", type=float, default=0.5, help="spread of stream lengths, as a fraction")
+    parser.add_argument("--speed", type=float, default=20, help="how much faster than real time streams run")
+    parser.add_argument("--bitrate", type=float, default=4e6, help="bits per second per stream")
+    parser.add_argument("--record-fail-rate", type=float, default=0)
+    parser.add_argument("--drive-latency", type=float, default=0.02, help="seconds per Drive request")
+    parser.add_argument("--drive-bandwidth", type=float, default=0, help="Drive upload bytes/s, 0 for no cap")
+    parser.add_argument("--drive-fail-rate", type=float, default=0)
+    parser.add_argument("--stable-seconds", type=float, help="override STABLE_SECONDS for the run")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="bench_results.json", help="where to write the results")
+    parser.add_argument("--baseline", help="results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed fraction worse than the baseline")
+    parser.add_argument("--save-baseline", help="also write the results here as the new baseline")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch folder for inspection")
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp(prefix="bench_pipeline_")
+    drive, endpoint = start_drive(args)
+    try:
+        returncode, wall, usage = run_pipeline(args, work, endpoint)
+        if returncode != 0:
+            print(f"Pipeline exited with {returncode}, see {os.path.join(work, 'pipeline.log')}")
+            args.keep = True
+            sys.exit(1)
+        results = collect(args, work, wall, usage)
+    finally:
+        drive.terminate()
+        drive.wait()
+        if args.keep:
+            print(f"Scratch folder kept: {work}")
+        else:
+            shutil.rmtree(work, ignore_errors=True)
+
+    report = {"config": {k: v for k, v in vars(args).items() if k not in ("output", "baseline", "save_baseline", "keep", "tolerance")},
+              "results": results}
+    print(json.dumps(results, indent=2))
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline["config"] != report["config"]:
+            print("Warning: the baseline was run with different settings")
+        print(f"Compared with {args.baseline}:")
+        regressions = compare(results, baseline["results"], args.tolerance)
+        if regressions:
+            print(f"Regressed by more than {args.tolerance:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+# Measures cold-start import cost with `python -X importtime` in a fresh interpreter for each
+# code path, so a heavy import creeping back to module level shows up as a number.
+#
+#   python bench_startup.py                  # report
+#   python bench_startup.py --budget-ms 150  # also exit 1 if the record path exceeds the budget
+
+PATHS = {
+    "record": "import yt_auto_download",
+    # What the first upload imports on top of the record path
+    "upload": "import yt_auto_download, google.auth, google.oauth2.credentials, google_auth_httplib2, "
+              "googleapiclient.discovery, googleapiclient.http",
+}
+
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+def import_times(code):
+    # One entry per module: (cumulative microseconds, module), top-level imports only
+    # Run from the repo so the imports resolve wherever this script is started from
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            cwd=os.path.dirname(os.path.abspath(__file__)),
+                            capture_output=True, text=True, check=True)
+    modules = []
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match and len(match.group(3)) == 1:
+            modules.append((int(match.group(2)), match.group(4)))
+    return modules
+
+def main():
+    parser = argparse.ArgumentParser(description="Report import time per module for each code path.")
+    parser.add_argument("--top", type=int, default=10, help="modules to list per path")
+    parser.add_argument("--budget-ms", type=float, help="fail if the record path imports take longer")
+    args = parser.parse_args()
+
+    totals = {}
+    for name, code in PATHS.items():
+        modules = import_times(code)
+        totals[name] = sum(us for us, _ in modules) / 1000
+        print(f"{name} path: {totals[name]:.1f} ms")
+        for us, module in sorted(modules, reverse=True)[:args.top]:
+            print(f"  {us / 1000:8.1f} ms  {module}")
+
+    if args.budget_ms is not None and totals["record"] > args.budget_ms:
+        print(f"Record path import time {totals['record']:.1f} ms is over the {args.budget_ms} ms budget")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,394 @@
+import argparse
+import hashlib
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Stand-in for the parts of the Drive v3 API the uploader uses, for running and benchmarking it
+# offline: files.create (simple, multipart and resumable uploads, including "bytes */N" status
+# queries), files.list and files.get with md5Checksum. Uploaded content is hashed and counted,
+# not kept. Point the uploader at it with DRIVE_API_ENDPOINT; without a token.json it then uses
+# anonymous credentials.
+#
+#   python fake_drive.py --port 8765 --latency 0.05 --bandwidth 20e6 --fail-rate 0.05
+#   DRIVE_API_ENDPOINT=http://127.0.0.1:8765/ python yt_auto_download.py --upload-only
+#
+# GET /_stats returns request, fault and byte counters as JSON.
+
+CHUNK = 64 * 1024
+FOLDER_MIME_TYPE = "application/vnd.google-apps.folder"
+DEFAULT_FIELDS = "kind,id,name,mimeType"
+
+ERROR_REASONS = {
+    400: "badRequest",
+    403: "rateLimitExceeded",
+    404: "notFound",
+    429: "rateLimitExceeded",
+    500: "backendError",
+    503: "backendError",
+}
+
+class Pacer:
+    # Spreads bytes out to `rate` per second across all connections
+    def __init__(self, rate):
+        self.rate = rate
+        self.next = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self, n):
+        with self.lock:
+            now = time.monotonic()
+            self.next = max(self.next, now) + n / self.rate
+            delay = self.next - now
+        if delay > 0:
+            time.sleep(delay)
+
+class Drive:
+    # File metadata and in-progress resumable sessions, shared by all handler threads
+    def __init__(self, args):
+        self.args = args
+        self.random = random.Random(args.seed)
+        self.bandwidth = Pacer(args.bandwidth) if args.bandwidth else None
+        self.files = {}
+        self.sessions = {}
+        self.lock = threading.Lock()
+        self.counter = 0
+        self.request_times = []
+        self.stats = {"requests": 0, "faults": 0, "dropped": 0, "throttled": 0, "bytes": 0,
+                      "files": 0, "sessions": 0}
+
+    def new_id(self, prefix):
+        with self.lock:
+            self.counter += 1
+            return f"{prefix}{self.counter:08d}"
+
+    def count(self, key, n=1):
+        with self.lock:
+            self.stats[key] += n
+
+    def over_rate(self):
+        # True if this request goes over --max-rps, counted over the last second
+        if not self.args.max_rps:
+            return False
+        with self.lock:
+            now = time.monotonic()
+            self.request_times = [t for t in self.request_times if now - t < 1]
+            if len(self.request_times) >= self.args.max_rps:
+                return True
+            self.request_times.append(now)
+            return False
+
+    def roll(self, rate):
+        with self.lock:
+            return self.random.random() < rate
+
+    def fault_status(self):
+        with self.lock:
+            return self.random.choice(self.args.fail_status)
+
+    def add_file(self, metadata, size, md5):
+        file = {
+            "kind": "drive#file",
+            "id": self.new_id("F"),
+            "name": metadata.get("name", "Untitled"),
+            "mimeType": metadata.get("mimeType", "application/octet-stream"),
+            "parents": metadata.get("parents", ["root"]),
+            "size": str(size),
+            "md5Checksum": md5,
+            "createdTime": time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime()),
+            "trashed": False,
+        }
+        if file["mimeType"] == FOLDER_MIME_TYPE:
+            del file["size"], file["md5Checksum"]
+        with self.lock:
+            self.files[file["id"]] = file
+        self.count("files")
+        return file
+
+def select(resource, fields):
+    # Apply a fields parameter such as "id,size" or "nextPageToken,files(id,name)"
+    result = {}
+    for field, nested in re.findall(r"([\w*]+)(?:\(([^)]*)\))?", fields):
+        if field == "*":
+            return dict(resource)
+        if field not in resource:
+            continue
+        value = resource[field]
+        if nested and isinstance(value, list):
+            value = [select(item, nested) for item in value]
+        result[field] = value
+    return result
+
+def matches(file, query):
+    # The subset of the files.list query language the uploader needs: clauses joined by "and"
+    for clause in re.split(r"\s+and\s+", query.strip()) if query.strip() else []:
+        match = re.fullmatch(r"(\w+)\s*(=|!=)\s*'((?:[^'\\]|\\.)*)'", clause)
+        if match:
+            field, op, value = match.groups()
+            if (file.get(field) == value.replace("\\'", "'")) != (op == "="):
+                return False
+            continue
+        match = re.fullmatch(r"'([^']*)'\s+in\s+parents", clause)
+        if match:
+            if match.group(1) not in file["parents"]:
+                return False
+            continue
+        match = re.fullmatch(r"trashed\s*=\s*(true|false)", clause)
+        if match:
+            if file["trashed"] != (match.group(1) == "true"):
+                return False
+            continue
+        raise ValueError(f"Unsupported query clause: {clause}")
+    return True
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, as with the real API
+    drive = None  # set by main()
+
+    def log_message(self, format, *args):
+        if self.drive.args.verbose:
+            super().log_message(format, *args)
+
+    # ---------- plumbing ----------
+    def send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_error_json(self, status, message=None, headers=None):
+        reason = ERROR_REASONS.get(status, "backendError")
+        message = message or reason
+        self.send_json(status, {"error": {
+            "code": status,
+            "message": message,
+            "errors": [{"domain": "usageLimits" if "Limit" in reason else "global", "reason": reason, "message": message}],
+        }}, headers)
+
+    def send_empty(self, status, headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def read_body(self, sink=None, drop_after=None):
+        # Read the request body in pieces under the bandwidth cap, passing each to sink (or
+        # collecting them). Stops early and returns None once drop_after bytes are read.
+        remaining = int(self.headers.get("Content-Length", 0))
+        parts = []
+        read = 0
+        while remaining:
+            if drop_after is not None and read >= drop_after:
+                return None
+            piece = self.rfile.read(min(CHUNK, remaining))
+            if not piece:
+                break
+            if self.drive.bandwidth:
+                self.drive.bandwidth.take(len(piece))
+            remaining -= len(piece)
+            read += len(piece)
+            self.drive.count("bytes", len(piece))
+            if sink:
+                sink(piece)
+            else:
+                parts.append(piece)
+        return b"".join(parts)
+
+    def drop(self):
+        # Hang up without answering, like a connection lost mid-request
+        self.drive.count("dropped")
+        self.close_connection = True
+
+    def injected_fault(self):
+        # Latency, then --max-rps and --fail-rate; True if an error response went out
+        self.drive.count("requests")
+        if self.drive.args.latency:
+            time.sleep(self.drive.args.latency * (0.5 + self.drive.random.random()))
+        if self.drive.over_rate():
+            self.drive.count("throttled")
+            self.read_body(sink=lambda piece: None)
+            self.send_error_json(429, "Rate limit exceeded", {"Retry-After": "1"})
+            return True
+        if self.drive.roll(self.drive.args.fail_rate):
+            self.drive.count("faults")
+            self.read_body(sink=lambda piece: None)
+            self.send_error_json(self.drive.fault_status())
+            return True
+        return False
+
+    # ---------- routes ----------
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        if url.path == "/_stats":
+            with self.drive.lock:
+                return self.send_json(200, dict(self.drive.stats))
+        if self.injected_fault():
+            return
+        if url.path == "/drive/v3/files":
+            return self.list_files(query)
+        match = re.fullmatch(r"/drive/v3/files/([^/]+)", url.path)
+        if match:
+            file = self.drive.files.get(match.group(1))
+            if file is None:
+                return self.send_error_json(404, f"File not found: {match.group(1)}")
+            return self.send_json(200, select(file, query.get("fields", DEFAULT_FIELDS)))
+        self.send_error_json(404, f"No such endpoint: {url.path}")
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        if self.injected_fault():
+            return
+        fields = query.get("fields", DEFAULT_FIELDS)
+        if url.path == "/drive/v3/files":
+            # Metadata only, e.g. creating a folder
+            metadata = json.loads(self.read_body() or b"{}")
+            return self.send_json(200, select(self.drive.add_file(metadata, 0, hashlib.md5().hexdigest()), fields))
+        if url.path not in ("/upload/drive/v3/files", "/resumable/upload/drive/v3/files"):
+            return self.send_error_json(404, f"No such endpoint: {url.path}")
+        upload_type = query.get("uploadType", "media")
+        if upload_type == "resumable":
+            return self.start_session(url, query)
+        if upload_type == "multipart":
+            metadata, data = self.read_multipart()
+        else:
+            metadata, data = {}, self.read_body()
+        file = self.drive.add_file(metadata, len(data), hashlib.md5(data).hexdigest())
+        self.send_json(200, select(file, fields))
+
+    def do_PUT(self):
+        url = urlparse(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        session = self.drive.sessions.get(query.get("upload_id"))
+        if session is None:
+            self.read_body(sink=lambda piece: None)
+            return self.send_error_json(404, "No such upload session")
+        if self.injected_fault():
+            return
+        self.put_chunk(session)
+
+    # ---------- endpoints ----------
+    def list_files(self, query):
+        try:
+            found = [f for f in self.drive.files.values() if matches(f, query.get("q", ""))]
+        except ValueError as e:
+            return self.send_error_json(400, str(e))
+        found.sort(key=lambda f: f["createdTime"])
+        start = int(query.get("pageToken", 0))
+        size = int(query.get("pageSize", 100))
+        body = {"kind": "drive#fileList", "incompleteSearch": False, "files": found[start:start + size]}
+        if start + size < len(found):
+            body["nextPageToken"] = str(start + size)
+        self.send_json(200, select(body, query.get("fields", "kind,incompleteSearch,nextPageToken,files(" + DEFAULT_FIELDS + ")")))
+
+    def read_multipart(self):
+        # multipart/related: a JSON metadata part, then the media. googleapiclient separates
+        # lines with bare \n, other clients with \r\n.
+        content_type = self.headers.get("Content-Type", "")
+        boundary = re.escape(re.search(r'boundary="?([^";]+)"?', content_type).group(1).encode())
+        parts = re.split(rb"(?:^|\r?\n)--" + boundary + rb"(?:--)?[ \t]*(?:\r?\n)?", self.read_body())
+        metadata_part, media_part = (re.split(rb"\r?\n\r?\n", part, maxsplit=1)[1] for part in parts[1:3])
+        return json.loads(metadata_part), media_part
+
+    def start_session(self, url, query):
+        metadata = json.loads(self.read_body() or b"{}")
+        upload_id = self.drive.new_id("U")
+        length = self.headers.get("X-Upload-Content-Length")
+        self.drive.sessions[upload_id] = {
+            "metadata": metadata,
+            "fields": query.get("fields", DEFAULT_FIELDS),
+            "total": int(length) if length else None,
+            "received": 0,
+            "md5": hashlib.md5(),
+            "file": None,
+            "lock": threading.Lock(),
+        }
+        self.drive.count("sessions")
+        host = self.headers.get("Host", f"127.0.0.1:{self.server.server_port}")
+        location = f"http://{host}/upload/drive/v3/files?uploadType=resumable&upload_id={upload_id}"
+        self.send_empty(200, {"Location": location})
+
+    def put_chunk(self, session):
+        match = re.fullmatch(r"bytes (?:(\d+)-(\d+)|\*)/(\d+|\*)", self.headers.get("Content-Range", "bytes */*"))
+        if match is None:
+            self.read_body(sink=lambda piece: None)
+            return self.send_error_json(400, "Bad Content-Range")
+        first, last, total = match.groups()
+        with session["lock"]:
+            if session["file"] is not None:
+                self.read_body(sink=lambda piece: None)
+                return self.send_json(200, select(session["file"], session["fields"]))
+            if total != "*":
+                session["total"] = int(total)
+            if first is not None:
+                first = int(first)
+                if first > session["received"]:
+                    self.read_body(sink=lambda piece: None)
+                    return self.send_error_json(400, f"Expected bytes from {session['received']}, got {first}")
+                # Bytes already held from an earlier attempt at this chunk are skipped
+                skip = [session["received"] - first]
+
+                def sink(piece):
+                    if skip[0] >= len(piece):
+                        skip[0] -= len(piece)
+                        return
+                    piece = piece[skip[0]:]
+                    skip[0] = 0
+                    session["md5"].update(piece)
+                    session["received"] += len(piece)
+
+                drop_after = None
+                if self.drive.roll(self.drive.args.drop_rate):
+                    drop_after = int(self.headers.get("Content-Length", 0)) // 2
+                if self.read_body(sink=sink, drop_after=drop_after) is None:
+                    return self.drop()
+            if session["total"] is not None and session["received"] >= session["total"]:
+                session["file"] = self.drive.add_file(session["metadata"], session["received"], session["md5"].hexdigest())
+                return self.send_json(200, select(session["file"], session["fields"]))
+        headers = {"Range": f"bytes=0-{session['received'] - 1}"} if session["received"] else {}
+        self.send_empty(308, headers)
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients hanging up mid-response are expected, not worth a traceback
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a local stand-in for the Drive v3 API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0, help="mean seconds added to every request (0.5x-1.5x)")
+    parser.add_argument("--bandwidth", type=float, default=0, help="upload bytes/s across all connections, 0 for no cap")
+    parser.add_argument("--max-rps", type=int, default=0, help="answer 429 above this many requests per second")
+    parser.add_argument("--fail-rate", type=float, default=0, help="fraction of requests answered with an error")
+    parser.add_argument("--fail-status", type=lambda s: [int(code) for code in s.split(",")], default=[429, 403, 500, 503],
+                        help="comma-separated statuses to pick injected errors from (403 means rateLimitExceeded)")
+    parser.add_argument("--drop-rate", type=float, default=0, help="fraction of chunk uploads cut off halfway")
+    parser.add_argument("--seed", type=int, help="random seed, for repeatable fault sequences")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args()
+
+    Handler.drive = Drive(args)
+    server = Server((args.host, args.port), Handler)
+    print(f"Drive stand-in on http://{args.host}:{server.server_port}/", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
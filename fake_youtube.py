@@ -0,0 +1,159 @@
+import argparse
+import hashlib
+import json
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Stand-in for the YouTube watch pages the live probe reads, for testing the scheduler offline.
+# Each video (or @channel for /@channel/live) is given a status:
+#
+#   live           live now
+#   upcoming:N     scheduled to start N seconds after the server started, then live
+#   upcoming       upcoming with no start time on the page yet
+#   finished       a video page that is neither live nor upcoming
+#   ended          a past live stream, with an end time
+#   unknown        a page without video details, like a consent wall
+#   404, 429 ...   that HTTP status
+#
+#   python fake_youtube.py --port 8766 --status aaaaaaaaaaa=live --status @news=upcoming:600 --default finished
+#   echo http://127.0.0.1:8766/watch?v=aaaaaaaaaaa >> urls.txt
+#
+# GET /_stats returns how often each video was probed, as JSON.
+
+DEFAULT_CHANNEL = "Fake channel"
+
+def channel_id(name):
+    return "UC" + hashlib.sha1(name.encode()).hexdigest()[:22]
+
+def parse_status(value):
+    if value.isdigit():
+        return int(value)
+    name, _, seconds = value.partition(":")
+    if name not in ("live", "upcoming", "finished", "ended", "unknown") or (seconds and name != "upcoming"):
+        raise argparse.ArgumentTypeError(f"unknown status: {value}")
+    return (name, float(seconds)) if seconds else (name, None)
+
+def parse_pair(value):
+    key, sep, rest = value.partition("=")
+    if not sep:
+        raise argparse.ArgumentTypeError(f"expected KEY=VALUE, got {value}")
+    return key, rest
+
+def parse_status_pair(value):
+    key, status = parse_pair(value)
+    return key, parse_status(status)
+
+def page_key(url):
+    # The video ID for /watch?v=ID and /live/ID, @name for /@name/live
+    query = parse_qs(url.query)
+    if "v" in query:
+        return query["v"][0]
+    parts = [part for part in url.path.split("/") if part]
+    if len(parts) == 2 and parts[0] == "live":
+        return parts[1]
+    if len(parts) == 2 and parts[0].startswith("@") and parts[1] == "live":
+        return parts[0]
+    return None
+
+def watch_page(key, status, start, channel):
+    # Just enough of ytInitialPlayerResponse for the probe, in YouTube's compact JSON
+    vid = key.lstrip("@")
+    details = {"videoId": vid, "title": f"Fake stream {vid}", "author": channel,
+               "channelId": channel_id(channel), "isLiveContent": True}
+    live_now = status == "live"
+    playability = {"status": "OK"}
+    if status == "upcoming":
+        details["isUpcoming"] = True
+        slate = {}
+        if start is not None:
+            slate["scheduledStartTime"] = str(int(start))
+        playability = {"status": "LIVE_STREAM_OFFLINE", "liveStreamability": {
+            "liveStreamabilityRenderer": {"offlineSlate": {"liveStreamOfflineSlateRenderer": slate}}}}
+    broadcast = {"isLiveNow": live_now}
+    if status == "ended":
+        broadcast["endTimestamp"] = time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime())
+    response = {"playabilityStatus": playability, "videoDetails": details,
+                "microformat": {"playerMicroformatRenderer": {"liveBroadcastDetails": broadcast}}}
+    return (f"<!DOCTYPE html><html><head><title>{details['title']}</title></head><body><script>"
+            f"var ytInitialPlayerResponse = {json.dumps(response, separators=(',', ':'))};"
+            f"</script></body></html>")
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, as the probe expects
+    args = None
+    started = None
+    stats = Counter()
+    lock = threading.Lock()
+
+    def send(self, status, body, content_type="text/html; charset=utf-8"):
+        body = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/_stats":
+            with self.lock:
+                return self.send(200, json.dumps(dict(self.stats)), "application/json")
+        key = page_key(url)
+        if key is None:
+            return self.send(404, "Not Found", "text/plain")
+        with self.lock:
+            self.stats[key] += 1
+        if self.args.latency:
+            time.sleep(self.args.latency)
+        status = dict(self.args.status).get(key, self.args.default)
+        if isinstance(status, int):
+            return self.send(status, f"HTTP {status}", "text/plain")
+        name, delay = status
+        start = self.started + delay if delay is not None else None
+        if start is not None and time.time() >= start:
+            name = "live"
+        if name == "unknown":
+            return self.send(200, "<!DOCTYPE html><html><body>Before you continue to YouTube</body></html>")
+        channel = dict(self.args.channel).get(key, key if key.startswith("@") else DEFAULT_CHANNEL)
+        self.send(200, watch_page(key, name, start, channel))
+
+    def log_message(self, format, *args):
+        if self.args.verbose:
+            super().log_message(format, *args)
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients hanging up mid-response are expected, not worth a traceback
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve local stand-ins for YouTube live watch pages.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--status", type=parse_status_pair, action="append", default=[], metavar="KEY=STATUS",
+                        help="status of a video ID or @channel")
+    parser.add_argument("--default", type=parse_status, default=parse_status("live"), help="status of everything else")
+    parser.add_argument("--channel", type=parse_pair, action="append", default=[], metavar="KEY=NAME",
+                        help=f"channel a video belongs to (default {DEFAULT_CHANNEL!r}, or @name itself)")
+    parser.add_argument("--latency", type=float, default=0, help="seconds added to every page")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args()
+
+    Handler.args = args
+    Handler.started = time.time()
+    server = Server((args.host, args.port), Handler)
+    print(f"YouTube stand-in on http://{args.host}:{server.server_port}/", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
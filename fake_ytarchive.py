@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+import argparse
+import hashlib
+import os
+import random
+import sys
+import time
+from urllib.parse import parse_qs, urlparse
+
+# Stands in for ytarchive so the recorder can be load-tested without YouTube: it prints
+# ytarchive-style progress, optionally waits for the "stream" to start, writes a .ts at the
+# configured bitrate while it runs and renames it to the final file when it ends. Failures
+# exit 1 like ytarchive does, leaving the .ts behind where ytarchive would leave fragments.
+# Select it with YTARCHIVE_BIN; its own options go there too:
+#
+#   YTARCHIVE_BIN="python3 fake_ytarchive.py --duration 120 --speed 20 --fail-rate 0.1" \
+#       python yt_auto_download.py --no-probe --record-only
+
+VERSION = "0.4.0-fake"
+FRAGMENT_SECONDS = 2  # Stream time per fragment, as with YouTube's default segment length
+FAIL_MODES = ("unavailable", "crash", "mux")
+
+def video_id(url):
+    parsed = urlparse(url)
+    vid = parse_qs(parsed.query).get("v", [None])[0]
+    return vid or "_".join(part for part in parsed.path.split("/") if part) or parsed.netloc
+
+def fail(message):
+    print(f"ERROR: {message}", flush=True)
+    sys.exit(1)
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate ytarchive recording a live stream.")
+    parser.add_argument("args", nargs="*", help="[record] URL [QUALITY], as the recorder passes them")
+    parser.add_argument("-o", "--output", default="%(title)s.%(ext)s")
+    parser.add_argument("--bitrate", type=float, default=6e6, help="bits per second of stream written")
+    parser.add_argument("--duration", type=float, default=60, help="stream length in seconds")
+    parser.add_argument("--jitter", type=float, default=0, help="randomize durations by up to this fraction")
+    parser.add_argument("--upcoming", type=float, default=0, help="seconds the stream waits to start")
+    parser.add_argument("--speed", type=float, default=1, help="run this many times faster than real time (same bytes)")
+    parser.add_argument("--fail-rate", type=float, default=0, help="fraction of runs that fail")
+    parser.add_argument("--fail-mode", choices=FAIL_MODES + ("any",), default="any",
+                        help="unavailable: exit at once; crash: die mid-stream; mux: fail after the last fragment")
+    parser.add_argument("--seed", type=int, help="make failures and durations repeatable per URL")
+    # ytarchive options the recorder may pass that the fake has no use for
+    parser.add_argument("-w", "--wait-for-stream", action="store_true", dest="wait_flag", help=argparse.SUPPRESS)
+    options, _ = parser.parse_known_args()
+
+    args = [arg for arg in options.args if arg != "record"]
+    if not args:
+        parser.error("no URL given")
+    url = args[0]
+    vid = video_id(url)
+    rng = random.Random(f"{options.seed}:{url}" if options.seed is not None else None)
+    duration = options.duration * (1 + rng.uniform(-options.jitter, options.jitter))
+    failure = None
+    if rng.random() < options.fail_rate:
+        failure = rng.choice(FAIL_MODES) if options.fail_mode == "any" else options.fail_mode
+
+    print(f"ytarchive {VERSION}", flush=True)
+    if failure == "unavailable":
+        fail("Video is unavailable. It may be private or deleted.")
+
+    waited = 0
+    while waited < options.upcoming:
+        print(f"Stream has not started yet, waiting {options.upcoming - waited:.0f}s...", end="\r", flush=True)
+        step = min(10, options.upcoming - waited)
+        time.sleep(step / options.speed)
+        waited += step
+    print("Selected quality: best (1080p60)", flush=True)
+    print(f"Stream started at time {time.strftime('%Y-%m-%dT%H:%M:%S%z')}", flush=True)
+
+    fields = {"id": vid, "title": f"Fake stream {vid}", "channel": "Fake channel", "ext": "mp4",
+              "upload_date": time.strftime("%Y%m%d")}
+    final = options.output % fields
+    if os.path.dirname(final):
+        os.makedirs(os.path.dirname(final), exist_ok=True)
+    temp = os.path.splitext(final)[0] + ".ts"
+
+    # One block of stream-specific bytes repeated, so files differ per video without the cost
+    # of generating random data for hundreds of streams
+    block = hashlib.shake_256(vid.encode()).digest(1024 * 1024)
+    fragment_bytes = int(options.bitrate / 8 * FRAGMENT_SECONDS)
+    fragments = max(int(duration / FRAGMENT_SECONDS), 1)
+    crash_at = rng.randint(1, fragments) if failure == "crash" else None
+    written = 0
+    start = time.monotonic()
+    with open(temp, "wb") as f:
+        for fragment in range(1, fragments + 1):
+            if fragment == crash_at:
+                print()
+                fail(f"Fragment {fragment}: connection reset by peer, giving up after 10 retries")
+            remaining = fragment_bytes
+            while remaining:
+                piece = block[:min(remaining, len(block))]
+                f.write(piece)
+                remaining -= len(piece)
+            f.flush()
+            written += fragment_bytes
+            print(f"Video Fragments: {fragment}; Audio Fragments: {fragment}; "
+                  f"Total Downloaded: {written / 2**20:.2f}MiB", end="\r", flush=True)
+            # Keep to the stream's own pace
+            delay = start + fragment * FRAGMENT_SECONDS / options.speed - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+    print()
+    print("Download Finished", flush=True)
+    print("Muxing final file...", flush=True)
+    if failure == "mux":
+        fail("ffmpeg exited with status 1, fragments kept")
+    os.replace(temp, final)
+    print(f"Final file: {os.path.abspath(final)}", flush=True)
+
+if __name__ == "__main__":
+    main()
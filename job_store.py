@@ -0,0 +1,276 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Durable state for the record -> upload pipeline, so a restarted run carries on from where the
+# last one stopped instead of re-probing every URL and rescanning the download folder.
+#
+# A job (one per URL) moves through
+#     discovered -> waiting -> recording -> recorded -> uploading -> uploaded -> verified
+# and can end up failed at any step. Every file a recording produced gets a row in uploads with
+# the upload half of the same states; once recording is over the job's state follows its files.
+# Video IDs that are done for good (recorded, or seen to be over) go in completed, which is
+# checked before anything else so a finished stream left in urls.txt costs one index lookup.
+#
+# Independently of its state, a job has next_action: when the URL is next due to be probed
+# (NULL while it is recording, or parked because it was taken out of urls.txt).
+#
+# Several processes may share the database (a recording daemon and an uploader, or overlapping
+# cron runs). Recording jobs and uploading files carry the owner process that set that state,
+# and only an owner that has died hands its rows back.
+
+DISCOVERED = "discovered"
+WAITING = "waiting"
+RECORDING = "recording"
+RECORDED = "recorded"
+UPLOADING = "uploading"
+UPLOADED = "uploaded"
+VERIFIED = "verified"
+FAILED = "failed"
+
+MAX_UPLOAD_ATTEMPTS = 5  # Failed uploads are retried by later runs up to this many attempts
+
+def process_token(pid):
+    # "pid:start time". The start time (Linux, from /proc) tells a process from a later one that
+    # was given the same pid, including this process restarted in a container as pid 1.
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            start = f.read().rsplit(")", 1)[1].split()[19]
+    except (OSError, IndexError):
+        start = "?"
+    return f"{pid}:{start}"
+
+OWNER = process_token(os.getpid())
+
+def owner_alive(owner):
+    if owner is None:
+        return False
+    pid = int(owner.split(":")[0])
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # exists, someone else's
+    return process_token(pid) == owner
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    url TEXT PRIMARY KEY,
+    video_id TEXT NOT NULL,
+    state TEXT NOT NULL,
+    scheduled_start REAL,
+    next_action REAL,
+    misses INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    owner TEXT,
+    channel TEXT,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_next_action ON jobs (next_action);
+
+CREATE TABLE IF NOT EXISTS uploads (
+    path TEXT PRIMARY KEY,
+    url TEXT,
+    state TEXT NOT NULL,
+    size INTEGER,
+    drive_id TEXT,
+    parents TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    owner TEXT,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS uploads_state ON uploads (state, updated);
+CREATE INDEX IF NOT EXISTS uploads_url ON uploads (url);
+
+CREATE TABLE IF NOT EXISTS completed (
+    video_id TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    path TEXT,
+    completed REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+class JobStore:
+    # One connection shared by all threads behind a lock. WAL mode lets another process (say
+    # upload_to_drive.py) use the same database while this one writes.
+
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("PRAGMA busy_timeout=5000")
+        self.db.executescript(SCHEMA)
+        # Columns added since the first schema, for databases created before them
+        for table, column in (("jobs", "owner"), ("uploads", "owner"), ("uploads", "parents"), ("jobs", "channel")):
+            if column not in {row[1] for row in self.db.execute(f"PRAGMA table_info({table})")}:
+                self.db.execute(f"ALTER TABLE {table} ADD COLUMN {column} TEXT")
+
+    def execute(self, sql, params=()):
+        with self.lock:
+            return self.db.execute(sql, params).fetchall()
+
+    def execute_in(self, sql, values):
+        # Rows for sql with its "IN (?)" expanded over values, in batches that stay under
+        # SQLite's limit on bound parameters
+        values = list(values)
+        rows = []
+        for i in range(0, len(values), 500):
+            batch = values[i:i + 500]
+            rows.extend(self.execute(sql.replace("IN (?)", f"IN ({','.join('?' * len(batch))})"), batch))
+        return rows
+
+    # ---------- jobs ----------
+    def discover(self, url, video_id, channel=None):
+        # New URLs are due immediately, and so are parked ones (removed from urls.txt and now back);
+        # others keep their state and schedule
+        self.execute(
+            "INSERT INTO jobs (url, video_id, state, next_action, channel, updated) VALUES (?, ?, ?, 0, ?, ?)"
+            " ON CONFLICT (url) DO UPDATE SET next_action = 0 WHERE next_action IS NULL AND state != ?",
+            (url, video_id, DISCOVERED, channel, time.time(), RECORDING))
+
+    def set_channel(self, url, channel):
+        self.execute("UPDATE jobs SET channel = ? WHERE url = ?", (channel, url))
+
+    def job(self, url):
+        with self.lock:
+            cursor = self.db.execute("SELECT * FROM jobs WHERE url = ?", (url,))
+            row = cursor.fetchone()
+        return dict(zip([column[0] for column in cursor.description], row)) if row else None
+
+    def due_jobs(self, now):
+        # URLs due to be probed, soonest first
+        return [url for url, in self.execute(
+            "SELECT url FROM jobs WHERE next_action <= ? ORDER BY next_action", (now,))]
+
+    def next_due(self):
+        rows = self.execute("SELECT MIN(next_action) FROM jobs")
+        return rows[0][0]
+
+    def schedule(self, url, at, state=None, misses=None, scheduled_start=None):
+        self.execute(
+            "UPDATE jobs SET next_action = ?, state = COALESCE(?, state), misses = COALESCE(?, misses),"
+            " scheduled_start = COALESCE(?, scheduled_start), updated = ? WHERE url = ?",
+            (at, state, misses, scheduled_start, time.time(), url))
+
+    def start_recording(self, url):
+        self.execute("UPDATE jobs SET state = ?, next_action = NULL, attempts = attempts + 1, error = NULL,"
+                     " owner = ?, updated = ? WHERE url = ?", (RECORDING, OWNER, time.time(), url))
+
+    def finish_recording(self, url, next_action, error=None):
+        # Recorded jobs have their misses reset; failed ones count as one more miss
+        self.execute(
+            "UPDATE jobs SET state = ?, error = ?, next_action = ?,"
+            " misses = CASE WHEN ? IS NULL THEN 0 ELSE misses + 1 END, updated = ? WHERE url = ?",
+            (FAILED if error else RECORDED, error, next_action, error, time.time(), url))
+
+    # ---------- completed videos ----------
+    def complete(self, video_id, url, path=None):
+        # path is None for streams that were over before they could be recorded
+        self.execute("INSERT OR REPLACE INTO completed (video_id, url, path, completed) VALUES (?, ?, ?, ?)",
+                     (video_id, url, path, time.time()))
+
+    def completed_videos(self, video_ids):
+        # {video ID: (output path, upload state)} for those of video_ids that are completed,
+        # looked up by primary key so the cost follows urls.txt, not the table
+        rows = self.execute_in(
+            "SELECT c.video_id, c.path, u.state FROM completed c LEFT JOIN uploads u ON u.path = c.path"
+            " WHERE c.video_id IN (?)", video_ids)
+        return {video_id: (path, state) for video_id, path, state in rows}
+
+    # ---------- uploads ----------
+    def add_file(self, path, url, size, parents=None):
+        # Registering a file again only refreshes its size, and its owning job and Drive folders
+        # where it had none; it keeps its state. The folders are kept so a later run retrying the
+        # upload puts the file where the first one would have.
+        self.execute(
+            "INSERT INTO uploads (path, url, state, size, parents, updated) VALUES (?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT (path) DO UPDATE SET size = excluded.size, url = COALESCE(url, excluded.url),"
+            " parents = COALESCE(excluded.parents, parents)",
+            (path, url, RECORDED, size, json.dumps(parents) if parents else None, time.time()))
+
+    def file_channel(self, path):
+        # The channel of the job that recorded path, if known
+        rows = self.execute("SELECT j.channel FROM uploads u JOIN jobs j ON j.url = u.url WHERE u.path = ?", (path,))
+        return rows[0][0] if rows else None
+
+    def uploaded_sizes(self, paths):
+        # {path: size} for those of paths already on Drive
+        return dict(self.execute_in(
+            f"SELECT path, size FROM uploads WHERE state IN ('{UPLOADED}', '{VERIFIED}') AND path IN (?)", paths))
+
+    def upload(self, path):
+        with self.lock:
+            cursor = self.db.execute("SELECT * FROM uploads WHERE path = ?", (path,))
+            row = cursor.fetchone()
+        if not row:
+            return None
+        upload = dict(zip([column[0] for column in cursor.description], row))
+        upload["parents"] = json.loads(upload["parents"]) if upload["parents"] else None
+        return upload
+
+    def claim_upload(self, path):
+        # Mark path uploading by this process. False if a live process is already uploading it.
+        rows = self.execute("SELECT state, owner FROM uploads WHERE path = ?", (path,))
+        if not rows:
+            return False
+        state, owner = rows[0]
+        if state == UPLOADING and owner != OWNER and owner_alive(owner):
+            return False
+        # Conditional on the owner we saw, in case another process claims it in between
+        rows = self.execute(
+            "UPDATE uploads SET state = ?, owner = ?, error = NULL, attempts = attempts + 1, updated = ?"
+            " WHERE path = ? AND owner IS ? RETURNING url", (UPLOADING, OWNER, time.time(), path, owner))
+        if rows and rows[0][0]:
+            self.refresh_job(rows[0][0])
+        return bool(rows)
+
+    def set_file_state(self, path, state, drive_id=None, error=None):
+        # Uploading goes through claim_upload(), which counts the attempt. A failure before that
+        # (the file vanished, say) counts as an attempt here so it is not retried forever.
+        rows = self.execute(
+            "UPDATE uploads SET attempts = attempts + (? = ? AND state != ?), state = ?, error = ?,"
+            " drive_id = COALESCE(?, drive_id), updated = ? WHERE path = ? RETURNING url",
+            (state, FAILED, UPLOADING, state, error, drive_id, time.time(), path))
+        if rows and rows[0][0]:
+            self.refresh_job(rows[0][0])
+
+    def refresh_job(self, url):
+        # A job whose recording is over shows failed if any of its files failed, uploading while
+        # any of them is, and otherwise the state of its least advanced file
+        if self.job(url)["state"] in (DISCOVERED, WAITING, RECORDING):
+            return
+        states = {state for state, in self.execute("SELECT state FROM uploads WHERE url = ?", (url,))}
+        for state in (FAILED, UPLOADING, RECORDED, UPLOADED, VERIFIED):
+            if state in states:
+                self.execute("UPDATE jobs SET state = ?, updated = ? WHERE url = ?", (state, time.time(), url))
+                return
+
+    def pending_uploads(self):
+        # Files recorded but not yet on Drive, including failed ones with attempts left, oldest
+        # first. Files being uploaded are not pending; resume_interrupted() returns those of dead
+        # processes to recorded.
+        return [path for path, in self.execute(
+            "SELECT path FROM uploads WHERE state = ? OR (state = ? AND attempts < ?) ORDER BY updated",
+            (RECORDED, FAILED, MAX_UPLOAD_ATTEMPTS))]
+
+    def resume_interrupted(self):
+        # Whatever processes that have since died left in flight. Their ytarchive processes died
+        # with them, so those URLs are due for a probe again; their uploads go back to pending and
+        # pick up their saved resumable sessions. Rows of live processes are left to them.
+        now = time.time()
+        owners = {owner for owner, in self.execute(
+            "SELECT owner FROM jobs WHERE state = ? UNION SELECT owner FROM uploads WHERE state = ?",
+            (RECORDING, UPLOADING))}
+        for owner in owners:
+            if owner_alive(owner):
+                continue
+            self.execute("UPDATE jobs SET state = ?, next_action = 0, updated = ? WHERE state = ? AND owner IS ?",
+                         (DISCOVERED, now, RECORDING, owner))
+            self.execute("UPDATE uploads SET state = ?, updated = ? WHERE state = ? AND owner IS ?",
+                         (RECORDED, now, UPLOADING, owner))
@@ -0,0 +1,132 @@
+import threading
+
+# Counters, gauges and histograms for the record -> upload pipeline, served in the Prometheus
+# text format on /metrics. A few dozen lines rather than prometheus_client, so the only
+# dependencies stay the Google libraries.
+#
+# Every metric takes optional labels as keyword arguments: counter.inc(reason="throttled").
+# A gauge can instead be computed at scrape time by passing fn, returning either a number or,
+# with label set, a {label value: number} dict.
+
+_registry = []
+_lock = threading.Lock()
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+def _format_labels(pairs):
+    if not pairs:
+        return ""
+    escape = lambda value: str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in pairs) + "}"
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.values = {}
+        with _lock:
+            _registry.append(self)
+
+    def samples(self):
+        # (suffix, label key, extra labels, value) tuples
+        with _lock:
+            return [("", key, (), value) for key, value in self.values.items()]
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name, help, fn=None, label=None):
+        super().__init__(name, help)
+        self.fn = fn
+        self.label = label
+
+    def set(self, value, **labels):
+        with _lock:
+            self.values[_label_key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self):
+        if self.fn is None:
+            return super().samples()
+        value = self.fn()
+        if self.label is None:
+            return [("", (), (), value)]
+        return [("", ((self.label, name),), (), v) for name, v in sorted(value.items())]
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, buckets):
+        super().__init__(name, help)
+        self.buckets = sorted(buckets)
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with _lock:
+            counts, total, observations = self.values.get(key, ([0] * len(self.buckets), 0, 0))
+            # Cumulative, as Prometheus expects: a value counts in every bucket it fits under
+            counts = [count + (value <= bound) for count, bound in zip(counts, self.buckets)]
+            self.values[key] = (counts, total + value, observations + 1)
+
+    def samples(self):
+        result = []
+        with _lock:
+            values = list(self.values.items())
+        for key, (counts, total, observations) in values:
+            for bound, count in zip(self.buckets, counts):
+                result.append(("_bucket", key, (("le", repr(float(bound))),), count))
+            result.append(("_bucket", key, (("le", "+Inf"),), observations))
+            result.append(("_sum", key, (), total))
+            result.append(("_count", key, (), observations))
+        return result
+
+def render():
+    lines = []
+    for metric in list(_registry):
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for suffix, key, extra, value in metric.samples():
+            lines.append(f"{metric.name}{suffix}{_format_labels(key + extra)} {value}")
+    return "\n".join(lines) + "\n"
+
+def serve(port, host="127.0.0.1"):
+    # Serve /metrics from a daemon thread; returns the server
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
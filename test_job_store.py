@@ -0,0 +1,146 @@
+import unittest
+
+import job_store
+from job_store import JobStore
+
+DEAD = "999999999:1"  # No such pid
+
+class JobStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.store = JobStore(":memory:")
+
+    def state(self, url):
+        return self.store.job(url)["state"]
+
+    def test_discover_is_due_at_once_and_unparks(self):
+        self.store.discover("u", "v")
+        self.assertEqual(self.store.due_jobs(0), ["u"])
+        self.store.schedule("u", None)
+        self.assertEqual(self.store.due_jobs(1e12), [])
+        self.store.discover("u", "v")
+        self.assertEqual(self.store.due_jobs(0), ["u"])
+
+    def test_discover_keeps_schedule_and_recording(self):
+        self.store.discover("u", "v")
+        self.store.schedule("u", 100, state=job_store.WAITING)
+        self.store.discover("u", "v")
+        self.assertEqual(self.store.job("u")["next_action"], 100)
+        self.store.start_recording("u")
+        self.store.discover("u", "v")
+        self.assertEqual(self.state("u"), job_store.RECORDING)
+        self.assertEqual(self.store.due_jobs(1e12), [])
+
+    def test_refresh_job_follows_least_advanced_file(self):
+        self.store.discover("u", "v")
+        self.store.start_recording("u")
+        self.store.add_file("a", "u", 1)
+        self.store.add_file("b", "u", 1)
+        self.store.finish_recording("u", None)
+        self.store.set_file_state("a", job_store.VERIFIED)
+        self.assertEqual(self.state("u"), job_store.RECORDED)
+        self.store.claim_upload("b")
+        self.assertEqual(self.state("u"), job_store.UPLOADING)
+        self.store.set_file_state("b", job_store.FAILED, error="boom")
+        self.assertEqual(self.state("u"), job_store.FAILED)
+        self.store.set_file_state("b", job_store.VERIFIED)
+        self.assertEqual(self.state("u"), job_store.VERIFIED)
+
+    def test_refresh_job_leaves_recording_alone(self):
+        self.store.discover("u", "v")
+        self.store.start_recording("u")
+        self.store.add_file("a", "u", 1)
+        self.store.set_file_state("a", job_store.VERIFIED)
+        self.assertEqual(self.state("u"), job_store.RECORDING)
+
+    def test_resume_interrupted_resets_only_dead_owners(self):
+        for url in ("live", "dead"):
+            self.store.discover(url, url)
+            self.store.start_recording(url)
+            self.store.add_file(url + ".mp4", url, 1)
+            self.store.claim_upload(url + ".mp4")
+        self.store.execute("UPDATE jobs SET owner = ? WHERE url = 'dead'", (DEAD,))
+        self.store.execute("UPDATE uploads SET owner = ? WHERE url = 'dead'", (DEAD,))
+        self.store.resume_interrupted()
+        self.assertEqual(self.state("live"), job_store.RECORDING)
+        self.assertEqual(self.store.upload("live.mp4")["state"], job_store.UPLOADING)
+        self.assertEqual(self.state("dead"), job_store.DISCOVERED)
+        self.assertEqual(self.store.due_jobs(0), ["dead"])
+        self.assertEqual(self.store.upload("dead.mp4")["state"], job_store.RECORDED)
+        self.assertEqual(self.store.pending_uploads(), ["dead.mp4"])
+
+    def test_resume_interrupted_resets_rows_without_owner(self):
+        # Databases from before owners were recorded
+        self.store.discover("u", "v")
+        self.store.execute("UPDATE jobs SET state = ?, next_action = NULL", (job_store.RECORDING,))
+        self.store.resume_interrupted()
+        self.assertEqual(self.store.due_jobs(0), ["u"])
+
+    def test_claim_upload_refuses_live_owner(self):
+        self.store.add_file("a", None, 1)
+        self.store.execute("UPDATE uploads SET state = ?, owner = ?",
+                           (job_store.UPLOADING, job_store.process_token(1)))
+        self.assertFalse(self.store.claim_upload("a"))
+        self.store.execute("UPDATE uploads SET owner = ?", (DEAD,))
+        self.assertTrue(self.store.claim_upload("a"))
+        self.assertEqual(self.store.upload("a")["owner"], job_store.OWNER)
+        self.assertFalse(self.store.claim_upload("missing"))
+
+    def test_pending_uploads_stops_after_max_attempts(self):
+        self.store.add_file("a", None, 1)
+        for attempt in range(job_store.MAX_UPLOAD_ATTEMPTS):
+            self.assertEqual(self.store.pending_uploads(), ["a"])
+            self.assertTrue(self.store.claim_upload("a"))
+            self.assertEqual(self.store.pending_uploads(), [])
+            self.store.set_file_state("a", job_store.FAILED, error="boom")
+        self.assertEqual(self.store.upload("a")["attempts"], job_store.MAX_UPLOAD_ATTEMPTS)
+        self.assertEqual(self.store.pending_uploads(), [])
+
+    def test_failure_before_upload_counts_as_attempt(self):
+        self.store.add_file("a", None, 1)
+        for attempt in range(job_store.MAX_UPLOAD_ATTEMPTS):
+            self.store.set_file_state("a", job_store.FAILED, error="gone")
+        self.assertEqual(self.store.pending_uploads(), [])
+
+    def test_add_file_keeps_parents_and_state(self):
+        self.store.add_file("a", None, 1, ["folder"])
+        self.store.set_file_state("a", job_store.UPLOADED)
+        self.store.add_file("a", None, 2)
+        upload = self.store.upload("a")
+        self.assertEqual(upload["parents"], ["folder"])
+        self.assertEqual(upload["state"], job_store.UPLOADED)
+        self.assertEqual(upload["size"], 2)
+
+    def test_add_file_fills_in_missing_job(self):
+        # A spool watcher may register a file before its recording does
+        self.store.add_file("a", None, 1)
+        self.store.add_file("a", "u", 1)
+        self.store.add_file("a", "other", 1)
+        self.assertEqual(self.store.upload("a")["url"], "u")
+
+    def test_completed_videos_looks_up_only_given_ids(self):
+        for i in range(1200):
+            self.store.complete(f"v{i}", f"u{i}")
+        wanted = [f"v{i}" for i in range(0, 3000, 2)]
+        self.assertEqual(set(self.store.completed_videos(wanted)), {f"v{i}" for i in range(0, 1200, 2)})
+        self.assertEqual(self.store.completed_videos([]), {})
+
+    def test_completed_videos_has_path_and_upload_state(self):
+        self.store.discover("u", "v")
+        self.store.add_file("spool/v/a.mp4", "u", 1)
+        self.store.set_file_state("spool/v/a.mp4", job_store.VERIFIED)
+        self.store.complete("v", "u", "spool/v/a.mp4")
+        self.store.complete("w", "u2")
+        self.assertEqual(self.store.completed_videos(["v", "w"]),
+                         {"v": ("spool/v/a.mp4", job_store.VERIFIED), "w": (None, None)})
+
+    def test_uploaded_sizes(self):
+        for i in range(600):
+            self.store.add_file(f"f{i}", None, i)
+            if i % 3 == 0:
+                self.store.set_file_state(f"f{i}", job_store.VERIFIED)
+        self.store.set_file_state("f1", job_store.UPLOADED)
+        sizes = self.store.uploaded_sizes([f"f{i}" for i in range(600)] + ["missing"])
+        self.assertEqual(sizes, {**{f"f{i}": i for i in range(0, 600, 3)}, "f1": 1})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+import os
+import tempfile
+import threading
+import unittest
+
+import job_store
+import yt_auto_download as yt
+
+class PollDelayTest(unittest.TestCase):
+    def test_grows_to_the_cap(self):
+        low, high = 1 - yt.POLL_JITTER, 1 + yt.POLL_JITTER
+        self.assertTrue(yt.POLL_INTERVAL * low <= yt.poll_delay(0) <= yt.POLL_INTERVAL * high)
+        self.assertTrue(yt.POLL_INTERVAL * 2 * low <= yt.poll_delay(1) <= yt.POLL_INTERVAL * 2 * high)
+        self.assertTrue(yt.POLL_MAX_INTERVAL * low <= yt.poll_delay(30) <= yt.POLL_MAX_INTERVAL * high)
+
+    def test_huge_miss_counts(self):
+        for misses in (1023, 1024, 10 ** 6):
+            self.assertLessEqual(yt.poll_delay(misses), yt.POLL_MAX_INTERVAL * (1 + yt.POLL_JITTER))
+
+class ParseLiveStatusTest(unittest.TestCase):
+    def test_live(self):
+        page = '{"videoDetails":{"videoId":"x"},"isLiveNow":true}'
+        self.assertEqual(yt.parse_live_status(page), (yt.LIVE, None))
+
+    def test_upcoming_with_start(self):
+        page = '{"videoDetails":{"isUpcoming":true},"scheduledStartTime":"1700000000"}'
+        self.assertEqual(yt.parse_live_status(page), (yt.UPCOMING, 1700000000))
+
+    def test_upcoming_without_start(self):
+        page = '{"videoDetails":{"isUpcoming":true},"isLiveNow":false}'
+        self.assertEqual(yt.parse_live_status(page), (yt.UPCOMING, None))
+
+    def test_finished(self):
+        page = '{"videoDetails":{"videoId":"x"},"isLiveNow":false}'
+        self.assertEqual(yt.parse_live_status(page), (yt.FINISHED, None))
+
+    def test_ended(self):
+        page = '{"videoDetails":{"videoId":"x"},"liveBroadcastDetails":{"isLiveNow":false,"endTimestamp":"2024-01-01T00:00:00+00:00"}}'
+        self.assertEqual(yt.parse_live_status(page), (yt.ENDED, None))
+
+    def test_unknown(self):
+        self.assertEqual(yt.parse_live_status("<html>Before you continue</html>"), (yt.UNKNOWN, None))
+
+    def test_channel(self):
+        channel = "UC" + "a" * 22
+        self.assertEqual(yt.parse_channel(f'{{"channelId":"{channel}"}}'), channel)
+        self.assertIsNone(yt.parse_channel("{}"))
+
+class UploadSchedulerTest(unittest.TestCase):
+    # One worker, held up by a first file until the rest are queued, so the dispatch order is the
+    # policy's alone. Runs in a scratch folder with an in-memory job store.
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.scratch = tempfile.TemporaryDirectory()
+        os.chdir(self.scratch.name)
+        self.saved_state = dict(yt._state)
+        yt._state["store"] = job_store.JobStore(":memory:")
+
+    def tearDown(self):
+        yt._state.clear()
+        yt._state.update(self.saved_state)
+        os.chdir(self.cwd)
+        self.scratch.cleanup()
+
+    def add(self, vid, channel, size=1, mtime=0):
+        url = f"https://www.youtube.com/watch?v={vid}"
+        yt.store().discover(url, vid, channel)
+        path = os.path.join("spool", vid, "stream.mp4")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(b"x" * size)
+        os.utime(path, (mtime, mtime))
+        yt.store().add_file(path, url, size)
+        return path
+
+    def dispatch(self, policy, paths, result=None, served=()):
+        # Names of the files in the order the scheduler ran them, and the scheduler
+        order = []
+        gate = threading.Event()
+        blocker = self.add("blocker", "blocker")
+        with yt.UploadScheduler(1, policy) as scheduler:
+            scheduler.served.update(dict(served))
+            scheduler.submit(lambda path: gate.wait(), blocker)
+            for path in paths:
+                scheduler.submit(lambda path: order.append(os.path.basename(os.path.dirname(path))) or result, path)
+            gate.set()
+        return order, scheduler
+
+    def test_oldest(self):
+        paths = [self.add("b", "c", mtime=200), self.add("a", "c", mtime=100), self.add("c", "c", mtime=300)]
+        self.assertEqual(self.dispatch("oldest", paths)[0], ["a", "b", "c"])
+
+    def test_smallest(self):
+        paths = [self.add("b", "c", size=20), self.add("a", "c", size=10), self.add("c", "c", size=30)]
+        self.assertEqual(self.dispatch("smallest", paths)[0], ["a", "b", "c"])
+
+    def test_fair_alternates_channels(self):
+        paths = [self.add(f"a{i}", "busy") for i in range(3)] + [self.add(f"q{i}", "quiet") for i in range(2)]
+        self.assertEqual(self.dispatch("fair", paths)[0], ["a0", "q0", "a1", "q1", "a2"])
+
+    def test_fair_forgets_earlier_backlog(self):
+        # A channel that sent a lot earlier in a long-running process does not queue behind the
+        # others when it comes back
+        paths = [self.add("q0", "quiet"), self.add("q1", "quiet"), self.add("b0", "busy")]
+        order, _ = self.dispatch("fair", paths, served={"busy": 300})
+        self.assertEqual(order, ["q0", "b0", "q1"])
+
+    def test_fair_does_not_count_skipped_files(self):
+        paths = [self.add(f"s{i}", "archive") for i in range(3)]
+        _, scheduler = self.dispatch("fair", paths, result=False)
+        self.assertEqual(scheduler.served["archive"], 0)
+
+    def test_priority(self):
+        with open(yt.UPLOAD_PRIORITIES_FILE, "w") as f:
+            f.write("not a valid line\nvip 5\nurgent 9\n")
+        paths = [self.add("a", "plain"), self.add("b", "vip"), self.add("urgent", "plain")]
+        self.assertEqual(self.dispatch("priority", paths)[0], ["urgent", "b", "a"])
+
+if __name__ == "__main__":
+    unittest.main()
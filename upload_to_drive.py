@@ -1,25 +1,17 @@
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
-from google.oauth2.credentials import Credentials
 import os
 
-# Load credentials
-creds = Credentials.from_authorized_user_file("token.json", ["https://www.googleapis.com/auth/drive.file"])
-
-# Build Drive service
-service = build('drive', 'v3', credentials=creds)
+from yt_auto_download import UPLOAD_WORKERS, UploadScheduler, is_temporary, not_uploaded, try_upload
 
 # ID of the folder in Google Drive where files will be uploaded
 FOLDER_ID = "1lVh1B2fSODUiJwyRb9BNpEJGqFyJaccD"
 
-# Upload all files in recordings/
+# Upload all files in recordings/, UPLOAD_WORKERS at a time in UPLOAD_POLICY order,
+# minus ytarchive's leftover fragments and files already uploaded
+files = []
 for filename in os.listdir("recordings"):
     filepath = os.path.join("recordings", filename)
-    if os.path.isfile(filepath):
-        file_metadata = {
-            'name': filename,
-            'parents': [FOLDER_ID]
-        }
-        media = MediaFileUpload(filepath)
-        service.files().create(body=file_metadata, media_body=media, fields='id').execute()
-        print(f"Uploaded {filename}")
+    if os.path.isfile(filepath) and not is_temporary(filename):
+        files.append(filepath)
+with UploadScheduler(UPLOAD_WORKERS) as pool:
+    for filepath in not_uploaded(files):
+        pool.submit(try_upload, filepath, [FOLDER_ID])
@@ -1,52 +1,1276 @@
-import os
-import subprocess
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
-import json
-
-# ---------- CONFIG ----------
-URLS_FILE = "urls.txt"  # Your livestream URLs
-DOWNLOAD_FOLDER = "downloads"  # Folder where ytarchive will save recordings
-
-# ---------- GOOGLE DRIVE ----------
-TOKEN_FILE = "token.json"
-
-# Read Google token
-creds = None
-if os.path.exists(TOKEN_FILE):
-    creds = Credentials.from_authorized_user_file(TOKEN_FILE, ["https://www.googleapis.com/auth/drive.file"])
-service = build("drive", "v3", credentials=creds)
-
-def upload_to_drive(file_path):
-    file_metadata = {'name': os.path.basename(file_path)}
-    media = MediaFileUpload(file_path, resumable=True)
-    service.files().create(body=file_metadata, media_body=media, fields='id').execute()
-    print(f"Uploaded {file_path} to Google Drive.")
-
-# ---------- MAIN ----------
-os.makedirs(DOWNLOAD_FOLDER, exist_ok=True)
-
-with open(URLS_FILE, "r") as f:
-    urls = [line.strip() for line in f if line.strip()]
-
-for url in urls:
-    print(f"Recording livestream: {url}")
-    # ytarchive command
-    result = subprocess.run([
-        "ytarchive",
-        "record",
-        url,
-        "--output", os.path.join(DOWNLOAD_FOLDER, "%(title)s.%(ext)s")
-    ], capture_output=True, text=True)
-    
-    print(result.stdout)
-    if result.returncode != 0:
-        print(f"Error recording {url}: {result.stderr}")
-        continue
-
-# Upload all files in DOWNLOAD_FOLDER to Google Drive
-for filename in os.listdir(DOWNLOAD_FOLDER):
-    file_path = os.path.join(DOWNLOAD_FOLDER, filename)
-    if os.path.isfile(file_path):
-        upload_to_drive(file_path)
+import os
+import errno
+import hashlib
+import shutil
+import subprocess
+import time
+import logging
+import threading
+from collections import Counter, deque
+from contextlib import nullcontext
+from logging.handlers import RotatingFileHandler
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import urlparse, parse_qs, urljoin
+import argparse
+import ctypes
+import ctypes.util
+import gzip
+import struct
+import heapq
+import queue
+import random
+import http.client
+import json
+import re
+import shlex
+
+import job_store
+import metrics
+from job_store import JobStore
+
+# The Google client libraries are imported inside the functions that use them: they cost more
+# than the rest of the script put together, and record-only runs never need them.
+
+# ---------- CONFIG ----------
+URLS_FILE = "urls.txt"  # Your livestream URLs
+DOWNLOAD_FOLDER = "downloads"  # Folder where ytarchive will save recordings
+SPOOL_FOLDER = "spool"  # Finished recordings are moved here; the uploader only ever looks here
+MAX_CONCURRENT_RECORDINGS = int(os.environ.get("MAX_CONCURRENT_RECORDINGS", "20"))  # ytarchive processes running at once
+YTARCHIVE_BIN = os.environ.get("YTARCHIVE_BIN", "ytarchive")  # Recorder command line; "python3 fake_ytarchive.py ..." simulates streams
+LOG_FOLDER = "logs"  # One rotating ytarchive log per URL, tail -f to watch progress
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUP_COUNT = 2
+LOG_TAIL_LINES = 50  # Recent output lines kept in memory for error reports
+UPLOAD_WORKERS = int(os.environ.get("UPLOAD_WORKERS", "4"))  # Parallel Drive uploads
+UPLOAD_CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE", str(32 * 1024 * 1024)))  # Bytes sent per resumable PUT
+UPLOAD_MEMORY_LIMIT = int(os.environ.get("UPLOAD_MEMORY_LIMIT", str(512 * 1024 * 1024)))  # Chunk buffers across all upload workers
+UPLOAD_MIN_CHUNK_SIZE = int(os.environ.get("UPLOAD_MIN_CHUNK_SIZE", str(1024 * 1024)))  # Floor for adaptive chunk sizing
+UPLOAD_TARGET_CHUNK_SECONDS = float(os.environ.get("UPLOAD_TARGET_CHUNK_SECONDS", "8"))  # Chunk size adapts toward PUTs this long
+CHUNK_STATS_FILE = "upload_chunk_stats.jsonl"  # Chunk sizes and timings per upload, for tuning the defaults above
+UPLOAD_POLICY = os.environ.get("UPLOAD_POLICY", "oldest")  # Upload order: oldest, smallest, fair (per channel) or priority
+UPLOAD_PRIORITIES_FILE = "upload_priorities.txt"  # For UPLOAD_POLICY=priority: "<video ID, channel ID or @handle> <priority>" per line, higher first
+QUEUE_STATS_FILE = "upload_queue_stats.jsonl"  # How long each file waited for an upload worker, for comparing policies
+EVENTS_FILE = "events.jsonl"  # One JSON line per pipeline state change, for seeing where each stream's time goes
+DRIVE_REQUESTS_PER_SECOND = float(os.environ.get("DRIVE_REQUESTS_PER_SECOND", 10))  # Shared by all upload workers
+DRIVE_BURST = 20  # Requests that may go out back to back after a quiet spell
+DRIVE_MAX_RETRIES = 8  # Per request, for throttling, 5xx responses and dropped connections
+DRIVE_BACKOFF_BASE = 1  # Seconds; retry n waits a random 0..DRIVE_BACKOFF_BASE * 2**n
+DRIVE_BACKOFF_MAX = 64  # Seconds, cap on a single retry wait
+MANIFEST_FILE = "upload_manifest.json"  # Files already on Drive, so they are never sent twice
+SESSIONS_FILE = "upload_sessions.json"  # Unfinished resumable uploads, picked up again after a crash
+JOBS_DB = "jobs.db"  # Recording and upload state (SQLite), so restarts resume where they stopped
+STABLE_SECONDS = float(os.environ.get("STABLE_SECONDS", "10"))  # A file must be unchanged this long before it is uploaded
+STABLE_MAX_WAIT = float(os.environ.get("STABLE_MAX_WAIT", "60"))  # Give up on a still-changing file after this long; it is retried later
+DRIVE_API_ENDPOINT = os.environ.get("DRIVE_API_ENDPOINT")  # Root URL of a local Drive stand-in for offline runs
+PROBE_WORKERS = int(os.environ.get("PROBE_WORKERS", "8"))  # Watch pages fetched in parallel, one kept-alive connection each
+PROBE_TIMEOUT = float(os.environ.get("PROBE_TIMEOUT", "15"))
+UPCOMING_WINDOW = int(os.environ.get("UPCOMING_WINDOW", "600"))  # Cron runs wait for upcoming streams scheduled to start within this many seconds
+LAUNCH_LEAD = int(os.environ.get("LAUNCH_LEAD", "60"))  # Start ytarchive this many seconds before an upcoming stream's scheduled start
+POLL_INTERVAL = float(os.environ.get("POLL_INTERVAL", "300"))  # --daemon: seconds between checks of a URL that is not live
+POLL_MAX_INTERVAL = float(os.environ.get("POLL_MAX_INTERVAL", "3600"))  # --daemon: backoff ceiling for URLs that keep coming up empty
+UPLOAD_RETRY_INTERVAL = float(os.environ.get("UPLOAD_RETRY_INTERVAL", "300"))  # --daemon and --watch: seconds between retries of failed and leftover uploads
+WATCH_POLL_INTERVAL = float(os.environ.get("WATCH_POLL_INTERVAL", "5"))  # Spool rescan period where inotify is unavailable
+FINISHED_PROBES = 3  # A video page seen neither live nor upcoming this many times in a row is marked completed
+POLL_JITTER = 0.2  # --daemon: +/- fraction applied to every poll interval so checks do not bunch up
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "0"))  # Serve Prometheus metrics on 127.0.0.1:<port>/metrics; 0 to disable
+DISCOVERY_FILE = os.environ.get("DISCOVERY_FILE")  # Drive v3 discovery JSON to use instead of the one bundled with googleapiclient
+
+# ---------- GOOGLE DRIVE ----------
+TOKEN_FILE = "token.json"
+SCOPES = ["https://www.googleapis.com/auth/drive.file"]
+
+# Token and discovery document are only loaded when the first upload needs them, so runs
+# with nothing to upload never touch them. Neither involves a network round trip.
+_drive_lock = threading.Lock()
+_creds = None
+_discovery_document = None
+
+def credentials():
+    global _creds
+    with _drive_lock:
+        if _creds is None:
+            import google.auth
+            from google.oauth2.credentials import Credentials
+            if os.path.exists(TOKEN_FILE):
+                _creds = Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
+            elif DRIVE_API_ENDPOINT:
+                # A local stand-in (fake_drive.py) does not check credentials
+                from google.auth.credentials import AnonymousCredentials
+                _creds = AnonymousCredentials()
+            else:
+                _creds, _ = google.auth.default(scopes=SCOPES)
+        return _creds
+
+def discovery_document():
+    global _discovery_document
+    with _drive_lock:
+        if _discovery_document is None:
+            from googleapiclient import discovery_cache
+            if DISCOVERY_FILE:
+                with open(DISCOVERY_FILE) as f:
+                    document = json.load(f)
+            else:
+                document = json.loads(discovery_cache.get_static_doc("drive", "v3"))
+            if DRIVE_API_ENDPOINT:
+                # Re-rooting the document points media upload URLs at the stand-in too
+                document["rootUrl"] = DRIVE_API_ENDPOINT
+            _discovery_document = document
+        return _discovery_document
+
+# ---------- UPLOAD MANIFEST ----------
+FINGERPRINT_SAMPLE = 1024 * 1024
+
+def fingerprint(file_path, size):
+    # Hash of the size plus the first, middle and last MiB: cheap even for 40 GB recordings
+    h = hashlib.blake2b(str(size).encode(), digest_size=16)
+    with open(file_path, "rb") as f:
+        for offset in sorted({0, max(size // 2 - FINGERPRINT_SAMPLE // 2, 0), max(size - FINGERPRINT_SAMPLE, 0)}):
+            f.seek(offset)
+            h.update(f.read(FINGERPRINT_SAMPLE))
+    return h.hexdigest()
+
+def save_json(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+def load_json(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+class UploadManifest:
+    # Maps absolute path -> {size, mtime, fingerprint, drive_id}, saved as JSON after every change
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = load_json(path)
+        self.by_fingerprint = {entry["fingerprint"]: entry for entry in self.entries.values()}
+
+    def lookup(self, file_path):
+        # Unchanged path/size/mtime is a dict hit; otherwise fall back to the content
+        # fingerprint so renamed or touched copies of an uploaded file are still skipped.
+        key = os.path.abspath(file_path)
+        st = os.stat(file_path)
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry and entry["size"] == st.st_size and entry["mtime"] == st.st_mtime_ns:
+            return entry["drive_id"]
+        with self.lock:
+            entry = self.by_fingerprint.get(fingerprint(file_path, st.st_size))
+        if entry:
+            self.record(file_path, entry["drive_id"])
+            return entry["drive_id"]
+        return None
+
+    def record(self, file_path, drive_id):
+        st = os.stat(file_path)
+        entry = {
+            "size": st.st_size,
+            "mtime": st.st_mtime_ns,
+            "fingerprint": fingerprint(file_path, st.st_size),
+            "drive_id": drive_id,
+        }
+        with self.lock:
+            self.entries[os.path.abspath(file_path)] = entry
+            self.by_fingerprint[entry["fingerprint"]] = entry
+            save_json(self.path, self.entries)
+
+class UploadSessions:
+    # Maps absolute path -> {uri, offset, size, fingerprint} for resumable uploads in progress.
+    # The offset is only a hint for humans; Drive is asked for the committed range on resume.
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = load_json(path)
+
+    def get(self, file_path):
+        with self.lock:
+            entry = self.entries.get(os.path.abspath(file_path))
+        if entry is None:
+            return None
+        size = os.path.getsize(file_path)
+        if entry["size"] != size or entry["fingerprint"] != fingerprint(file_path, size):
+            # The file changed since the session was opened, so its bytes on Drive are stale
+            self.discard(file_path)
+            return None
+        return entry
+
+    def save(self, file_path, uri, offset):
+        key = os.path.abspath(file_path)
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is None or entry["uri"] != uri:
+            size = os.path.getsize(file_path)
+            entry = {"uri": uri, "size": size, "fingerprint": fingerprint(file_path, size)}
+        entry = dict(entry, offset=offset)
+        with self.lock:
+            self.entries[key] = entry
+            save_json(self.path, self.entries)
+
+    def discard(self, file_path):
+        with self.lock:
+            if self.entries.pop(os.path.abspath(file_path), None) is not None:
+                save_json(self.path, self.entries)
+
+# Opened on first use, like the Drive credentials, so importing this module (upload_to_drive.py,
+# bench_startup.py) creates no files and pays for no SQLite setup
+_state_lock = threading.Lock()
+_state = {}
+
+def _open_once(name, factory):
+    if name not in _state:
+        with _state_lock:
+            if name not in _state:
+                _state[name] = factory()
+    return _state[name]
+
+def manifest():
+    return _open_once("manifest", lambda: UploadManifest(MANIFEST_FILE))
+
+def sessions():
+    return _open_once("sessions", lambda: UploadSessions(SESSIONS_FILE))
+
+def store():
+    return _open_once("store", lambda: JobStore(JOBS_DB))
+
+# ---------- METRICS ----------
+_recording = {}  # video ID -> (job folder, start time) for each ytarchive process running
+
+def recording_sizes():
+    # Bytes each running recording has written so far, fragments included
+    sizes = {}
+    for vid, (folder, started) in list(_recording.items()):
+        total = 0
+        for root, _, names in os.walk(folder):
+            for name in names:
+                try:
+                    st = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue  # renamed or deleted while we looked
+                if st.st_mtime >= started:
+                    total += st.st_size
+        sizes[vid] = total
+    return sizes
+
+def disk_free():
+    return {folder: shutil.disk_usage(folder).free for folder in (DOWNLOAD_FOLDER, SPOOL_FOLDER) if os.path.isdir(folder)}
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+PIPELINE_BUCKETS = (5, 15, 30, 60, 120, 300, 600, 1800, 3600, 7200, 21600)
+
+active_recordings = metrics.Gauge("yt_active_recordings", "ytarchive processes running", fn=lambda: len(_recording))
+recorded_bytes = metrics.Gauge("yt_recorded_bytes", "Bytes written so far by each running recording",
+                               fn=recording_sizes, label="video_id")
+recordings_total = metrics.Counter("yt_recordings_total", "ytarchive runs finished, by result")
+upload_queue_depth = metrics.Gauge("yt_upload_queue_depth", "Files waiting for an upload worker")
+upload_concurrency = metrics.Gauge("yt_upload_concurrency_limit", "Uploads currently allowed to talk to Drive at once",
+                                   fn=lambda: int(upload_slots.limit))
+upload_bytes = metrics.Counter("yt_upload_bytes_total", "Bytes sent to Drive (rate() for bytes/s)")
+uploads_total = metrics.Counter("yt_uploads_total", "Files done with, by result")
+drive_request_seconds = metrics.Histogram("yt_drive_request_seconds", "Drive API request latency, by outcome",
+                                          LATENCY_BUCKETS)
+drive_retries = metrics.Counter("yt_drive_retries_total", "Drive requests retried, by reason")
+record_to_upload_seconds = metrics.Histogram("yt_record_to_upload_seconds",
+                                             "From a recording's last write to Drive confirming its upload",
+                                             PIPELINE_BUCKETS)
+disk_free_bytes = metrics.Gauge("yt_disk_free_bytes", "Free space where recordings are kept", fn=disk_free, label="folder")
+
+# ---------- EVENTS ----------
+# Every stage a stream goes through, in order:
+#     waiting -> recording -> recorded -> spooled -> queued -> dispatched -> uploading -> verified
+# (or finished, for a video found already over; failed, uploaded for one already on Drive,
+# deferred for a file still being written). "t" is CLOCK_MONOTONIC, comparable across processes
+# on the same boot, so the gap between a stream's events is the time it spent in each stage.
+_events_lock = threading.Lock()
+
+def emit(stage, vid, nbytes=None, duration=None, **fields):
+    line = json.dumps({
+        "t": round(time.monotonic(), 3),
+        "ts": round(time.time(), 3),
+        "video_id": vid,
+        "stage": stage,
+        "bytes": nbytes,
+        "duration": round(duration, 3) if duration is not None else None,
+        **fields,
+    })
+    with _events_lock, open(EVENTS_FILE, "a") as f:
+        f.write(line + "\n")
+
+def file_video_id(file_path):
+    # spool() files recordings under SPOOL_FOLDER/<video ID>/
+    return os.path.basename(os.path.dirname(file_path))
+
+# ---------- UPLOAD ----------
+CHUNK_ALIGNMENT = 256 * 1024  # Drive only accepts chunks in multiples of 256 KiB
+
+_thread_local = threading.local()
+
+_stats_lock = threading.Lock()
+
+def align_chunk(size):
+    return max(size // CHUNK_ALIGNMENT, 1) * CHUNK_ALIGNMENT
+
+def upload_chunk_size():
+    # Largest chunk allowed. Each worker holds exactly one chunk in memory at a time, so capping
+    # it at its share of UPLOAD_MEMORY_LIMIT bounds memory regardless of recording size.
+    return align_chunk(min(UPLOAD_CHUNK_SIZE, UPLOAD_MEMORY_LIMIT // UPLOAD_WORKERS))
+
+class ChunkSizer:
+    # Doubles the chunk while PUTs finish in under half of UPLOAD_TARGET_CHUNK_SECONDS and halves
+    # it when they take over twice that or fail: fewer round trips on fast links, less to resend
+    # on flaky ones. Uploads start from the size the previous one settled on.
+    last_size = None
+
+    def __init__(self):
+        self.max_size = upload_chunk_size()
+        self.min_size = min(align_chunk(UPLOAD_MIN_CHUNK_SIZE), self.max_size)
+        self.size = min(max(ChunkSizer.last_size or self.min_size, self.min_size), self.max_size)
+        self.samples = []
+
+    def observe(self, sent, seconds):
+        self.samples.append({"chunk_size": self.size, "bytes": sent, "seconds": round(seconds, 3)})
+        if seconds < UPLOAD_TARGET_CHUNK_SECONDS / 2:
+            self.resize(self.size * 2)
+        elif seconds > UPLOAD_TARGET_CHUNK_SECONDS * 2:
+            self.resize(self.size // 2)
+
+    def failed(self):
+        self.resize(self.size // 2)
+
+    def resize(self, size):
+        self.size = ChunkSizer.last_size = min(max(align_chunk(size), self.min_size), self.max_size)
+
+    def save_stats(self, file_path):
+        sent = sum(sample["bytes"] for sample in self.samples)
+        seconds = sum(sample["seconds"] for sample in self.samples)
+        line = json.dumps({
+            "file": file_path,
+            "bytes": sent,
+            "seconds": round(seconds, 3),
+            "mb_per_s": round(sent / seconds / 1e6, 2) if seconds else None,
+            "chunks": self.samples,
+        })
+        with _stats_lock, open(CHUNK_STATS_FILE, "a") as f:
+            f.write(line + "\n")
+
+    def chunksize(self):
+        return self.size
+
+class TokenBucket:
+    # Spaces requests out to rate per second on average, letting up to burst through at once
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.stamp = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.tokens + (now - self.stamp) * self.rate, self.burst)
+                self.stamp = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+class ConcurrencyLimit:
+    # How many uploads may talk to Drive at once, AIMD style as in TCP congestion control: halved
+    # when Drive throttles us, and grown by one after about `limit` requests in a row go through.
+    # Workers over the limit wait in acquire() before starting their upload.
+
+    def __init__(self, maximum):
+        self.maximum = maximum
+        self.limit = float(maximum)
+        self.active = 0
+        self.decreased = 0
+        self.cond = threading.Condition()
+
+    def __enter__(self):
+        with self.cond:
+            while self.active >= int(self.limit):
+                self.cond.wait()
+            self.active += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        with self.cond:
+            self.active -= 1
+            self.cond.notify()
+
+    def succeeded(self):
+        with self.cond:
+            if self.limit < self.maximum:
+                self.limit = min(self.limit + 1 / self.limit, self.maximum)
+                self.cond.notify_all()
+
+    def throttled(self):
+        # Concurrent uploads tend to get throttled together; count that as one signal
+        with self.cond:
+            now = time.monotonic()
+            if now - self.decreased >= DRIVE_BACKOFF_BASE and self.limit > 1:
+                self.decreased = now
+                self.limit = max(self.limit / 2, 1)
+                print(f"Drive is throttling uploads, down to {int(self.limit)} at a time.")
+
+drive_rate = TokenBucket(DRIVE_REQUESTS_PER_SECOND, DRIVE_BURST)
+upload_slots = ConcurrencyLimit(UPLOAD_WORKERS)
+
+def is_throttled(error):
+    # 429, or 403 with one of Drive's rate limit reasons (other 403s are real permission errors)
+    if error.resp.status == 429:
+        return True
+    if error.resp.status != 403:
+        return False
+    try:
+        reasons = [e.get("reason") for e in json.loads(error.content)["error"]["errors"]]
+    except (ValueError, KeyError, TypeError):
+        return False
+    return bool({"rateLimitExceeded", "userRateLimitExceeded"} & set(reasons))
+
+def drive_call(fn, on_retry=None):
+    # Make one Drive request under the shared rate limit. Throttling, 5xx responses and dropped
+    # connections are retried with jittered exponential backoff (or Drive's Retry-After, if
+    # longer); anything else, or running out of retries, raises.
+    import httplib2
+    from googleapiclient.errors import HttpError
+    for attempt in range(DRIVE_MAX_RETRIES + 1):
+        drive_rate.acquire()
+        wait_at_least = 0
+        started = time.monotonic()
+        try:
+            result = fn()
+        except HttpError as e:
+            drive_request_seconds.observe(time.monotonic() - started, outcome=str(e.resp.status))
+            throttled = is_throttled(e)
+            if attempt == DRIVE_MAX_RETRIES or not (throttled or e.resp.status >= 500):
+                raise
+            if throttled:
+                upload_slots.throttled()
+            retry_after = e.resp.get("retry-after", "")
+            wait_at_least = int(retry_after) if retry_after.isdigit() else 0
+            reason = f"HTTP {e.resp.status}"
+            drive_retries.inc(reason="throttled" if throttled else "server_error")
+        except (OSError, httplib2.HttpLib2Error) as e:
+            drive_request_seconds.observe(time.monotonic() - started, outcome="connection")
+            if attempt == DRIVE_MAX_RETRIES:
+                raise
+            reason = str(e) or type(e).__name__
+            drive_retries.inc(reason="connection")
+        else:
+            drive_request_seconds.observe(time.monotonic() - started, outcome="ok")
+            upload_slots.succeeded()
+            return result
+        if on_retry:
+            on_retry()
+        delay = max(random.uniform(0, min(DRIVE_BACKOFF_BASE * 2 ** attempt, DRIVE_BACKOFF_MAX)), wait_at_least)
+        print(f"Drive request failed ({reason}), retrying in {delay:.1f}s.")
+        time.sleep(delay)
+
+def drive_service():
+    # httplib2 is not thread-safe, so every upload thread gets its own authorized transport
+    service = getattr(_thread_local, "service", None)
+    if service is None:
+        from google_auth_httplib2 import AuthorizedHttp
+        from googleapiclient.discovery import build_from_document
+        from googleapiclient.http import build_http
+        # build_http() rather than a bare httplib2.Http: it stops httplib2 treating the
+        # resumable protocol's "308 Resume Incomplete" as a redirect
+        http = AuthorizedHttp(credentials(), http=build_http())
+        # Building from the already-parsed document takes well under a millisecond
+        service = _thread_local.service = build_from_document(discovery_document(), http=http)
+    return service
+
+def resume_session(request, file_path):
+    # Point request at the session saved by an earlier run and ask Drive how much it already has.
+    # Returns the created file if that session had in fact completed, otherwise None.
+    session = sessions().get(file_path)
+    if session is None:
+        return None
+    size = os.path.getsize(file_path)
+
+    def query():
+        from googleapiclient.errors import HttpError
+        resp, content = request.http.request(session["uri"], "PUT", headers={
+            "Content-Range": f"bytes */{size}",
+            "Content-Length": "0",
+        })
+        if resp.status not in (200, 201, 308, 404, 410):
+            raise HttpError(resp, content, uri=session["uri"])
+        return resp, content
+    resp, content = drive_call(query)
+    if resp.status in (200, 201):
+        return json.loads(content)
+    if resp.status == 308:
+        request.resumable_uri = session["uri"]
+        request.resumable_progress = int(resp["range"].split("-")[1]) + 1 if "range" in resp else 0
+        print(f"Resuming upload of {file_path} at byte {request.resumable_progress} of {size}.")
+        return None
+    # 404/410: the session expired, start over with a new one
+    sessions().discard(file_path)
+    return None
+
+def upload_to_drive(file_path, parents=None):
+    drive_id = manifest().lookup(file_path)
+    if drive_id:
+        print(f"Skipping {file_path}, already on Google Drive ({drive_id}).")
+        store().set_file_state(file_path, job_store.UPLOADED, drive_id=drive_id)
+        uploads_total.inc(result="skipped")
+        emit(job_store.UPLOADED, file_video_id(file_path), path=file_path, drive_id=drive_id)
+        return drive_id
+    if not store().claim_upload(file_path):
+        print(f"Skipping {file_path}, another process is uploading it.")
+        return None
+    file_metadata = {'name': os.path.basename(file_path)}
+    if parents:
+        file_metadata['parents'] = parents
+    from googleapiclient.http import MediaFileUpload
+    sizer = ChunkSizer()
+    media = MediaFileUpload(file_path, chunksize=sizer.max_size, resumable=True)
+    # next_chunk() asks chunksize() before every PUT, so the sizer can change it mid-upload
+    media.chunksize = sizer.chunksize
+    # Read each chunk into bytes instead of streaming a slice of the file: httplib2 silently
+    # re-sends a request whose connection dropped, and a half-read slice would go out short
+    # of its Content-Length and hang the PUT. One chunk per worker is within the memory bound.
+    media.has_stream = lambda: False
+    request = drive_service().files().create(body=file_metadata, media_body=media, fields='id,size')
+    with upload_slots:
+        emit(job_store.UPLOADING, file_video_id(file_path), media.size(), path=file_path)
+        started = time.monotonic()
+        file = resume_session(request, file_path)
+        while file is None:
+            offset = request.resumable_progress
+            start = time.monotonic()
+            try:
+                # After a failed PUT, next_chunk() first asks Drive how much it kept
+                _, file = drive_call(request.next_chunk, on_retry=sizer.failed)
+            except Exception:
+                sizer.failed()
+                raise
+            sent = (media.size() if file else request.resumable_progress) - offset
+            sizer.observe(sent, time.monotonic() - start)
+            upload_bytes.inc(sent)
+            if file is None:
+                sessions().save(file_path, request.resumable_uri, request.resumable_progress)
+    sessions().discard(file_path)
+    sizer.save_stats(file_path)
+    if int(file.get('size', -1)) != media.size():
+        raise IOError(f"Drive has {file.get('size')} bytes of {file['id']}, expected {media.size()}")
+    manifest().record(file_path, file['id'])
+    store().set_file_state(file_path, job_store.VERIFIED, drive_id=file['id'])
+    record_to_upload_seconds.observe(time.time() - os.path.getmtime(file_path))
+    uploads_total.inc(result="verified")
+    emit(job_store.VERIFIED, file_video_id(file_path), media.size(), time.monotonic() - started,
+         path=file_path, drive_id=file['id'])
+    print(f"Uploaded {file_path} to Google Drive.")
+    return file['id']
+
+def open_for_writing(file_path):
+    # True if another process has file_path open for writing. Linux only (reads /proc); elsewhere
+    # the size/mtime window in wait_until_stable() has to do on its own.
+    target = os.path.realpath(file_path)
+    own_pid = str(os.getpid())
+    try:
+        pids = [pid for pid in os.listdir("/proc") if pid.isdigit() and pid != own_pid]
+    except OSError:
+        return False
+    for pid in pids:
+        try:
+            fds = os.listdir(f"/proc/{pid}/fd")
+        except OSError:
+            continue  # exited, or not ours to look at
+        for fd in fds:
+            try:
+                if os.readlink(f"/proc/{pid}/fd/{fd}") != target:
+                    continue
+                with open(f"/proc/{pid}/fdinfo/{fd}") as f:
+                    flags = next(int(line.split()[1], 8) for line in f if line.startswith("flags:"))
+            except (OSError, StopIteration):
+                continue
+            if flags & (os.O_WRONLY | os.O_RDWR):
+                return True
+    return False
+
+def wait_until_stable(file_path):
+    # Wait until file_path has kept the same size and mtime for STABLE_SECONDS and no other
+    # process has it open for writing. False if it is still changing after STABLE_MAX_WAIT.
+    deadline = time.monotonic() + STABLE_MAX_WAIT
+    previous = None
+    while True:
+        st = os.stat(file_path)
+        current = (st.st_size, st.st_mtime_ns)
+        quiet = time.time() - st.st_mtime
+        if current == previous and quiet >= STABLE_SECONDS and not open_for_writing(file_path):
+            return True
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        previous = current
+        time.sleep(min(max(STABLE_SECONDS - quiet, 1), remaining))
+
+def try_upload(file_path, parents=None):
+    # Runs on the upload pool, where an uncaught exception would just vanish into a future.
+    # Returns False if it sent nothing: the file was already on Drive, or was still being
+    # written and has been left for later.
+    started = time.monotonic()
+    try:
+        size = os.path.getsize(file_path)
+        known = store().upload(file_path)
+        if known and known["state"] in (job_store.UPLOADED, job_store.VERIFIED) and known["size"] == size:
+            print(f"Skipping {file_path}, already on Google Drive ({known['drive_id']}).")
+            uploads_total.inc(result="skipped")
+            return False
+        store().add_file(file_path, None, size, parents)
+        parents = parents or (known and known["parents"])
+        # Checked before waiting for the file to settle, which costs at least a second: files
+        # already on Drive go straight to being skipped, and spooled recordings (registered with
+        # their job's URL) were renamed in whole
+        on_drive = manifest().lookup(file_path)
+        if not on_drive and not (known and known["url"]) and not wait_until_stable(file_path):
+            print(f"Not uploading {file_path} yet, it is still being written.")
+            emit("deferred", file_video_id(file_path), duration=time.monotonic() - started, path=file_path)
+            return False
+        upload_to_drive(file_path, parents)
+        return not on_drive
+    except Exception as e:
+        print(f"Error uploading {file_path}: {e}")
+        store().set_file_state(file_path, job_store.FAILED, error=str(e))
+        uploads_total.inc(result="failed")
+        emit(job_store.FAILED, file_video_id(file_path), duration=time.monotonic() - started, path=file_path, error=str(e))
+    return True
+
+# ---------- UPLOAD SCHEDULER ----------
+# Each policy ranks a queued file (lowest key goes first) at the moment a worker frees up, given
+# how many files each channel has had dispatched so far. That count is virtual time, as in fair
+# queueing: a channel that joins the queue again starts from the lowest count among the channels
+# still queued, so neither an idle spell nor a backlog long since sent carries over, and files
+# that were only skipped (fn returned False) do not count. A file's channel is that of the job
+# that recorded it: the channel ID from its watch page, or the @handle of a /@handle/live URL.
+# Files the job store cannot place count as a channel of their own, named by their spool folder.
+UPLOAD_POLICIES = {
+    "oldest": lambda item, served: item["mtime"],
+    "smallest": lambda item, served: item["size"],
+    "fair": lambda item, served: (served[item["channel"]], item["queued"]),
+    "priority": lambda item, served: (-item["priority"], item["queued"]),
+}
+
+def load_priorities():
+    priorities = {}
+    if os.path.exists(UPLOAD_PRIORITIES_FILE):
+        with open(UPLOAD_PRIORITIES_FILE) as f:
+            for number, line in enumerate(f, 1):
+                if not line.strip() or line.startswith("#"):
+                    continue
+                try:
+                    name, priority = line.split()
+                    priorities[name] = int(priority)
+                except ValueError:
+                    print(f"Ignoring line {number} of {UPLOAD_PRIORITIES_FILE}, expected '<name> <priority>': {line.strip()}")
+    return priorities
+
+class UploadScheduler:
+    # Drop-in for the upload ThreadPoolExecutor: submit(fn, file_path) queues the file and returns
+    # a Future, and each free worker runs fn on whichever queued file the policy ranks first.
+    # Leaving the with block waits for the queue to drain.
+
+    def __init__(self, workers, policy=UPLOAD_POLICY):
+        self.key = UPLOAD_POLICIES[policy]
+        self.policy = policy
+        self.priorities = load_priorities() if policy == "priority" else {}
+        self.cond = threading.Condition()
+        self.pending = []
+        self.served = Counter()
+        self.closed = False
+        self.threads = [threading.Thread(target=self.work, name=f"uploader-{i}", daemon=True) for i in range(workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        for thread in self.threads:
+            thread.join()
+
+    def submit(self, fn, file_path, *args):
+        try:
+            st = os.stat(file_path)
+            size, mtime = st.st_size, st.st_mtime
+        except OSError:
+            size, mtime = 0, 0  # fn will report it
+        vid = file_video_id(file_path)
+        channel = store().file_channel(file_path) or vid
+        item = {
+            "fn": fn, "args": (file_path,) + args, "future": Future(),
+            "path": file_path, "size": size, "mtime": mtime, "vid": vid, "channel": channel,
+            "priority": self.priorities.get(vid, self.priorities.get(channel, 0)), "queued": time.monotonic(),
+        }
+        emit("queued", vid, size, path=file_path, channel=channel)
+        with self.cond:
+            if not any(other["channel"] == channel for other in self.pending):
+                self.served[channel] = min((self.served[other["channel"]] for other in self.pending), default=0)
+            self.pending.append(item)
+            upload_queue_depth.inc()
+            self.cond.notify()
+        return item["future"]
+
+    def work(self):
+        while True:
+            with self.cond:
+                while not self.pending and not self.closed:
+                    self.cond.wait()
+                if not self.pending:
+                    return
+                # A linear scan rather than a heap, because "fair" depends on what was served
+                # since the file was queued; queues are hundreds of files at most
+                item = min(self.pending, key=lambda item: self.key(item, self.served))
+                self.pending.remove(item)
+                upload_queue_depth.dec()
+                self.served[item["channel"]] += 1
+            self.save_stats(item)
+            emit("dispatched", item["vid"], duration=time.monotonic() - item["queued"], path=item["path"])
+            if item["future"].set_running_or_notify_cancel():
+                try:
+                    result = item["fn"](*item["args"])
+                except BaseException as e:
+                    item["future"].set_exception(e)
+                else:
+                    if result is False:
+                        with self.cond:
+                            self.served[item["channel"]] -= 1
+                    item["future"].set_result(result)
+
+    def save_stats(self, item):
+        line = json.dumps({
+            "file": item["path"],
+            "policy": self.policy,
+            "size": item["size"],
+            "queued_seconds": round(time.monotonic() - item["queued"], 3),
+        })
+        with _stats_lock, open(QUEUE_STATS_FILE, "a") as f:
+            f.write(line + "\n")
+
+# ---------- LIVE PROBE ----------
+LIVE, UPCOMING, FINISHED, ENDED, UNKNOWN = "live", "upcoming", "finished", "ended", "unknown"
+
+_probe_local = threading.local()
+
+def http_get(url, redirects=3):
+    # GET over a connection kept alive per thread and host, so probing a batch of watch pages
+    # pays the TCP/TLS handshake once per worker instead of once per URL
+    connections = _probe_local.__dict__.setdefault("connections", {})
+    parsed = urlparse(url)
+    key = (parsed.scheme, parsed.netloc)
+    path = parsed.path + (f"?{parsed.query}" if parsed.query else "")
+    headers = {"User-Agent": "Mozilla/5.0", "Accept-Language": "en", "Accept-Encoding": "gzip"}
+    for attempt in range(2):
+        conn = connections.get(key)
+        if conn is None:
+            conn_class = http.client.HTTPSConnection if parsed.scheme == "https" else http.client.HTTPConnection
+            conn = connections[key] = conn_class(parsed.netloc, timeout=PROBE_TIMEOUT)
+        try:
+            conn.request("GET", path, headers=headers)
+            resp = conn.getresponse()
+            body = resp.read()
+            break
+        except (http.client.HTTPException, ConnectionError):
+            # The server dropped the idle connection; reconnect once
+            conn.close()
+            del connections[key]
+            if attempt:
+                raise
+    if resp.status in (301, 302, 303, 307, 308) and redirects:
+        return http_get(urljoin(url, resp.getheader("Location")), redirects - 1)
+    if resp.getheader("Content-Encoding") == "gzip":
+        body = gzip.decompress(body)
+    return resp.status, body.decode("utf-8", errors="replace")
+
+def parse_live_status(page):
+    # Returns (status, scheduled start as a unix timestamp or None) from a watch page. An
+    # upcoming stream may not have its start time on the page yet; it is upcoming all the same.
+    if '"isUpcoming":true' in page:
+        scheduled = re.search(r'"scheduledStartTime":"(\d+)"', page)
+        return UPCOMING, int(scheduled.group(1)) if scheduled else None
+    if '"isLiveNow":true' in page:
+        return LIVE, None
+    if '"endTimestamp":"' in page:
+        # A past live stream: its broadcast has an end time
+        return ENDED, None
+    if '"videoDetails":' in page:
+        # A video page that is neither live nor upcoming: the stream is over, or never was one
+        return FINISHED, None
+    return UNKNOWN, None
+
+def parse_channel(page):
+    # The channel ID (UC...) a watch page belongs to, or None
+    match = re.search(r'"channelId":"(UC[\w-]{22})"', page)
+    return match.group(1) if match else None
+
+def probe(url):
+    # (status, scheduled start or None, channel ID or None)
+    try:
+        status, page = http_get(url)
+    except (OSError, http.client.HTTPException) as e:
+        print(f"Could not probe {url}: {e}")
+        return UNKNOWN, None, None
+    if status != 200:
+        return UNKNOWN, None, None
+    return parse_live_status(page) + (parse_channel(page),)
+
+def poll_delay(misses):
+    # Exponential backoff for URLs that keep coming up empty, with jitter. misses keeps growing
+    # for URLs that never go live, so the exponent is capped before it overflows a float.
+    delay = min(POLL_INTERVAL * 2 ** min(misses, 32), POLL_MAX_INTERVAL)
+    return delay * random.uniform(1 - POLL_JITTER, 1 + POLL_JITTER)
+
+def launch_time(start):
+    # When to spawn ytarchive for a stream scheduled at start (unix time)
+    return start - LAUNCH_LEAD
+
+def actionable(urls, window=UPCOMING_WINDOW, pool=None):
+    # Probe urls and return (launch time, url) for those worth recording: live now, starting
+    # within window seconds, or unknown (let ytarchive decide rather than risk missing a stream).
+    # The rest get their next probe time in the job store().
+    jobs = []
+    now = time.time()
+    with ThreadPoolExecutor(max_workers=PROBE_WORKERS) if pool is None else nullcontext(pool) as pool:
+        for url, (status, start, channel) in zip(urls, pool.map(probe, urls)):
+            if channel:
+                store().set_channel(url, channel)
+            if status in (FINISHED, ENDED):
+                misses = store().job(url)["misses"] + 1
+                emit("finished", video_id(url), url=url)
+                if concrete_video_id(url) and (status == ENDED or misses >= FINISHED_PROBES):
+                    # A stream the page shows as over, or a video that kept coming up neither
+                    # live nor upcoming, is done for good: indexed so later runs skip it before
+                    # any probe, and parked
+                    print(f"Skipping {url}: stream is over")
+                    store().complete(concrete_video_id(url), url)
+                    store().schedule(url, None, misses=misses)
+                    continue
+                print(f"Skipping {url}: not live")
+                store().schedule(url, now + poll_delay(misses), misses=misses)
+            elif status == UPCOMING:
+                # Waiting costs a row in the job store, not a ytarchive process
+                if store().job(url)["state"] != job_store.WAITING:
+                    emit(job_store.WAITING, video_id(url), url=url, scheduled_start=start)
+                if start is None:
+                    print(f"Skipping {url}: upcoming, no start time yet")
+                    store().schedule(url, now + POLL_INTERVAL, state=job_store.WAITING)
+                    continue
+                store().schedule(url, min(launch_time(start), now + POLL_MAX_INTERVAL),
+                               state=job_store.WAITING, scheduled_start=start)
+                if start - now > window:
+                    print(f"Skipping {url}: upcoming, starts in {int(start - now)}s")
+                else:
+                    jobs.append((launch_time(start), url))
+            else:
+                jobs.append((now, url))
+    return jobs
+
+# ---------- RECORDING ----------
+def video_id(url):
+    parsed = urlparse(url)
+    query = parse_qs(parsed.query)
+    if "v" in query:
+        return query["v"][0]
+    # youtu.be/<id>, /live/<id>, /@channel/live ...
+    return "_".join(part for part in parsed.path.split("/") if part) or parsed.netloc
+
+def url_channel(url):
+    # The @handle of a /@handle/live URL, None for URLs that name a video
+    part = next((part for part in urlparse(url).path.split("/") if part), "")
+    return part if part.startswith("@") else None
+
+def concrete_video_id(url):
+    # The YouTube video ID when url names a single video (watch?v=, youtu.be/, /live/<id>), None
+    # for channel URLs like /@channel/live whose next stream will be a different video
+    parsed = urlparse(url)
+    vid = parse_qs(parsed.query).get("v", [None])[0]
+    parts = [part for part in parsed.path.split("/") if part]
+    if vid is None and parsed.netloc.endswith("youtu.be") and parts:
+        vid = parts[0]
+    elif vid is None and len(parts) == 2 and parts[0] == "live":
+        vid = parts[1]
+    return vid if vid and re.fullmatch(r"[A-Za-z0-9_-]{11}", vid) else None
+
+TEMP_SUFFIXES = (".ts", ".part", ".frag", ".temp", ".tmp", ".partial")  # ytarchive fragments and half-copied files
+
+def is_temporary(name):
+    return name.endswith(TEMP_SUFFIXES) or name.startswith(".")
+
+def list_files(folder):
+    paths = []
+    for root, _, files in os.walk(folder):
+        paths.extend(os.path.join(root, name) for name in files if not is_temporary(name))
+    return paths
+
+def not_uploaded(paths):
+    # paths minus the files the job store has on Drive at their current size, so rescanning a
+    # spool of finished uploads queues nothing
+    done = store().uploaded_sizes(paths)
+    remaining = []
+    for path in paths:
+        try:
+            if path in done and os.path.getsize(path) == done[path]:
+                continue
+        except OSError:
+            pass  # try_upload reports it
+        remaining.append(path)
+    return remaining
+
+def spool(file_path, vid, url=None):
+    # Move a finished recording into SPOOL_FOLDER/<vid>/ in one atomic rename, so anything that
+    # shows up in the spool is complete. Copies via a .partial name when the spool is on another
+    # filesystem. With url, the file is registered as that job's before it appears, so a spool
+    # watcher that sees it first already finds its job.
+    spool_dir = os.path.join(SPOOL_FOLDER, vid)
+    os.makedirs(spool_dir, exist_ok=True)
+    target = os.path.join(spool_dir, os.path.basename(file_path))
+    if os.path.exists(target):
+        # A channel URL recorded a new stream under the same name
+        root, ext = os.path.splitext(target)
+        target = f"{root}.{int(time.time())}{ext}"
+    if url:
+        store().add_file(target, url, os.path.getsize(file_path))
+    try:
+        os.replace(file_path, target)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.copy2(file_path, target + ".partial")
+        os.replace(target + ".partial", target)
+        os.remove(file_path)
+    return target
+
+def open_job_log(vid):
+    os.makedirs(LOG_FOLDER, exist_ok=True)
+    handler = RotatingFileHandler(os.path.join(LOG_FOLDER, f"{vid}.log"),
+                                  maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT)
+    handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+    log = logging.getLogger(f"ytarchive.{vid}")
+    log.setLevel(logging.INFO)
+    log.propagate = False
+    log.addHandler(handler)
+    return log, handler
+
+def record(url):
+    vid = video_id(url)
+    # Each URL records into its own folder so we know exactly which files this job produced
+    job_folder = os.path.join(DOWNLOAD_FOLDER, vid)
+    os.makedirs(job_folder, exist_ok=True)
+    log, handler = open_job_log(vid)
+    tail = deque(maxlen=LOG_TAIL_LINES)
+    print(f"Recording livestream: {url} (log: {handler.baseFilename})")
+    started = time.time()
+    _recording[vid] = (job_folder, started)
+    emit(job_store.RECORDING, vid, url=url)
+    try:
+        # ytarchive command
+        proc = subprocess.Popen([
+            *shlex.split(YTARCHIVE_BIN),
+            "record",
+            url,
+            "--output", os.path.join(job_folder, "%(title)s.%(ext)s")
+        ], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, errors="replace")
+        # Progress updates end in \r; universal newlines splits on those too
+        for line in proc.stdout:
+            line = line.rstrip()
+            if line:
+                log.info(line)
+                tail.append(line)
+        returncode = proc.wait()
+        recordings_total.inc(result="ok" if returncode == 0 else "failed")
+    finally:
+        _recording.pop(vid, None)
+        log.removeHandler(handler)
+        handler.close()
+    # Only what this run wrote; older files in the folder are leftovers of failed attempts
+    files = [path for path in list_files(job_folder) if os.path.getmtime(path) >= started]
+    emit(job_store.RECORDED if returncode == 0 else job_store.FAILED, vid, sum(map(os.path.getsize, files)),
+         time.time() - started, url=url, exit=returncode)
+    return returncode, "\n".join(tail), files
+
+def record_all(jobs, on_recorded=None):
+    # jobs are (launch time, url) pairs. Every URL gets its own ytarchive process once its launch
+    # time comes; until then an upcoming stream is only a heap entry, not a process waiting in a
+    # pool slot. Results are reported in completion order, and on_recorded is called with each
+    # successful job's files while the other recordings keep going.
+    pending = list(jobs)
+    heapq.heapify(pending)
+    futures = {}
+    failed = []
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_RECORDINGS) as pool:
+        while pending or futures:
+            while pending and pending[0][0] <= time.time():
+                url = heapq.heappop(pending)[1]
+                store().start_recording(url)
+                futures[pool.submit(record, url)] = url
+            timeout = max(pending[0][0] - time.time(), 0) if pending else None
+            done, _ = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                url = futures.pop(future)
+                if not finish_recording(url, future, on_recorded):
+                    failed.append(url)
+    return failed
+
+def finish_recording(url, future, on_recorded=None):
+    # Report a finished record() future and record the outcome in the job store(). A recorded URL
+    # is due for a probe again right away (a channel's /live URL may already have a new stream);
+    # a failed one backs off.
+    try:
+        returncode, tail, files = future.result()
+    except OSError as e:
+        returncode, tail, files = None, str(e), []
+    if returncode != 0:
+        print(f"Error recording {url} (exit {returncode}):\n{tail}")
+        store().finish_recording(url, time.time() + poll_delay(store().job(url)["misses"] + 1), error=tail)
+        return False
+    print(f"Finished recording {url} (exit 0)")
+    store().finish_recording(url, time.time())
+    files = [spool(file_path, video_id(url), url) for file_path in files]
+    for file_path in files:
+        emit("spooled", video_id(url), os.path.getsize(file_path), path=file_path)
+    if concrete_video_id(url):
+        store().complete(concrete_video_id(url), url, files[0] if files else None)
+    store().refresh_job(url)
+    if on_recorded:
+        on_recorded(files)
+    return True
+
+# ---------- SPOOL WATCHER ----------
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_Q_OVERFLOW = 0x4000
+IN_ISDIR = 0x40000000
+INOTIFY_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len, then len bytes of name
+
+class SpoolWatcher:
+    # Calls on_file(path) for every file that appears complete in folder or its subfolders: closed
+    # after writing or renamed in. Uses inotify (through libc, no extra dependency), so pickup is
+    # immediate and costs nothing per idle file; elsewhere it falls back to rescanning the folder
+    # every WATCH_POLL_INTERVAL seconds. Files already there when it starts are reported once.
+
+    def __init__(self, folder, on_file):
+        self.folder = folder
+        self.on_file = on_file
+        self.watches = {}  # watch descriptor -> directory
+
+    def start(self):
+        threading.Thread(target=self.run, name="spool-watcher", daemon=True).start()
+
+    def run(self):
+        libc = self.load_inotify()
+        if libc is None:
+            print(f"inotify unavailable, polling {self.folder} every {WATCH_POLL_INTERVAL}s")
+            self.poll()
+        else:
+            self.watch(libc)
+
+    def load_inotify(self):
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            libc.inotify_init1
+        except (OSError, AttributeError):
+            return None
+        return libc
+
+    def poll(self):
+        seen = set()
+        while True:
+            for path in list_files(self.folder):
+                if path not in seen:
+                    seen.add(path)
+                    self.on_file(path)
+            time.sleep(WATCH_POLL_INTERVAL)
+
+    def watch(self, libc):
+        fd = libc.inotify_init1(os.O_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.add_tree(libc, fd, self.folder)
+        while True:
+            data = os.read(fd, 64 * 1024)
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+                offset += INOTIFY_EVENT.size
+                name = data[offset:offset + length].rstrip(b"\0").decode()
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    # Events were dropped: rescan everything rather than miss a file
+                    self.add_tree(libc, fd, self.folder)
+                elif wd in self.watches:
+                    path = os.path.join(self.watches[wd], name)
+                    if mask & IN_ISDIR:
+                        # A new per-video folder; files may have landed before the watch did
+                        self.add_tree(libc, fd, path)
+                    elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO) and not is_temporary(name):
+                        self.on_file(path)
+
+    def add_tree(self, libc, fd, folder):
+        # Watch folder and everything under it, then report the files already there
+        for root, _, _ in os.walk(folder):
+            wd = libc.inotify_add_watch(fd, root.encode(), IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE)
+            if wd >= 0:
+                self.watches[wd] = root
+        for path in list_files(folder):
+            self.on_file(path)
+
+# ---------- DAEMON ----------
+def run_daemon(on_recorded=None):
+    # Stays resident instead of being relaunched by cron, so the interpreter, credentials, probe
+    # connections and the upload threads' Drive services are all paid for once. Which URL to probe
+    # next comes from the job store's next_action index; urls.txt is re-read every cycle so edits
+    # apply without a restart.
+    recording = {}  # future -> url
+    finished = queue.Queue()  # futures of ytarchive jobs that exited, handled on this thread
+    with ThreadPoolExecutor(max_workers=PROBE_WORKERS) as prober, \
+         ThreadPoolExecutor(max_workers=MAX_CONCURRENT_RECORDINGS) as recorder:
+        while True:
+            urls = set(read_urls())
+            for url in urls:
+                store().discover(url, video_id(url), url_channel(url))
+
+            now = time.time()
+            due = []
+            for url in store().due_jobs(now):
+                if url in urls:
+                    due.append(url)
+                else:
+                    store().schedule(url, None)  # removed from urls.txt; discover() brings it back
+            # Upcoming streams get a ytarchive process LAUNCH_LEAD seconds before go-live; until
+            # then their next probe is set for that moment
+            for _, url in actionable(due, window=LAUNCH_LEAD, pool=prober):
+                store().start_recording(url)  # takes it off the due list before the next cycle
+                future = recorder.submit(record, url)
+                recording[future] = url
+                future.add_done_callback(finished.put)
+
+            # Sleep until the next probe is due, waking early whenever a recording ends
+            next_due = store().next_due()
+            timeout = max(next_due - time.time(), 0) if next_due is not None else POLL_INTERVAL
+            try:
+                future = finished.get(timeout=min(timeout, POLL_INTERVAL))
+            except queue.Empty:
+                continue
+            while True:
+                finish_recording(recording.pop(future), future, on_recorded)
+                try:
+                    future = finished.get_nowait()
+                except queue.Empty:
+                    break
+
+# ---------- MAIN ----------
+def read_urls():
+    # URLs from urls.txt, minus videos that are already done: checked before any probe or
+    # ytarchive process, so finished streams left in the file cost one index lookup each
+    with open(URLS_FILE, "r") as f:
+        urls = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    completed = store().completed_videos({concrete_video_id(url) for url in urls} - {None})
+    return [url for url in urls if concrete_video_id(url) not in completed]
+
+def main():
+    parser = argparse.ArgumentParser(description="Record the livestreams in urls.txt and upload them to Google Drive.")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--record-only", action="store_true", help="record, but leave uploading to a later run")
+    mode.add_argument("--upload-only", action="store_true", help="upload what is in the spool folder, record nothing")
+    parser.add_argument("--no-probe", action="store_true", help="start ytarchive for every URL without checking it is live")
+    parser.add_argument("--daemon", action="store_true", help="stay running and poll every URL on its own schedule instead of exiting")
+    parser.add_argument("--watch", action="store_true", help="with --upload-only: stay running and upload files as they land in the spool")
+    args = parser.parse_args()
+    if args.daemon and (args.upload_only or args.no_probe):
+        parser.error("--daemon cannot be combined with --upload-only or --no-probe")
+    if args.watch and not args.upload_only:
+        parser.error("--watch only applies to --upload-only")
+
+    os.makedirs(DOWNLOAD_FOLDER, exist_ok=True)
+    os.makedirs(SPOOL_FOLDER, exist_ok=True)
+    store().resume_interrupted()
+    if METRICS_PORT:
+        try:
+            metrics.serve(METRICS_PORT)
+            print(f"Metrics on http://127.0.0.1:{METRICS_PORT}/metrics")
+        except OSError as e:
+            print(f"Not serving metrics on port {METRICS_PORT}: {e}")
+
+    jobs = []
+    if not args.upload_only:
+        # Upload-only runs record nothing, so they need no urls.txt
+        urls = read_urls()
+        for url in urls:
+            store().discover(url, video_id(url), url_channel(url))
+        if args.no_probe:
+            jobs = [(0, url) for url in urls]
+        elif not args.daemon:
+            # Only URLs due for a probe; the rest are waiting or backing off
+            due = set(store().due_jobs(time.time()))
+            jobs = actionable([url for url in urls if url in due])
+
+    if args.record_only:
+        # Never imports the Google client libraries
+        if args.daemon:
+            run_daemon()
+        else:
+            record_all(jobs)
+        return
+
+    # Finished recordings are handed straight to the uploader while other streams keep recording
+    queued = set()
+    queued_lock = threading.Lock()
+    with UploadScheduler(UPLOAD_WORKERS) as uploader:
+        def queue_uploads(files):
+            for file_path in not_uploaded(list(files)):
+                with queued_lock:
+                    if file_path in queued:
+                        continue
+                    queued.add(file_path)
+                future = uploader.submit(try_upload, file_path)
+                future.add_done_callback(lambda future, file_path=file_path: forget(file_path))
+
+        def forget(file_path):
+            # Once its upload is over, whatever the outcome, a file can be queued again: by the
+            # spool watcher when a still-changing file's writer closes it, or by retry_uploads().
+            # Files that are done are skipped quickly, and failed ones only until they run out
+            # of attempts.
+            with queued_lock:
+                queued.discard(file_path)
+
+        def retry_uploads():
+            while True:
+                time.sleep(UPLOAD_RETRY_INTERVAL)
+                store().resume_interrupted()
+                queue_uploads(store().pending_uploads())
+
+        # Uploads an earlier run did not finish
+        queue_uploads(store().pending_uploads())
+        if args.daemon or args.watch:
+            # Long-running modes retry failed uploads and take over those of processes that died
+            threading.Thread(target=retry_uploads, name="upload-retry", daemon=True).start()
+
+        if args.daemon:
+            # Also picks up recordings spooled by other processes, e.g. a --record-only daemon
+            SpoolWatcher(SPOOL_FOLDER, lambda path: queue_uploads([path])).start()
+            run_daemon(on_recorded=queue_uploads)
+        elif args.watch:
+            SpoolWatcher(SPOOL_FOLDER, lambda path: queue_uploads([path])).run()
+        elif args.upload_only:
+            # Also whatever was put in the spool by hand or before the job store existed
+            queue_uploads(list_files(SPOOL_FOLDER))
+        else:
+            record_all(jobs, on_recorded=queue_uploads)
+
+if __name__ == "__main__":
+    main()